@@ -0,0 +1,61 @@
+"""
+JSON encoding for the /api/v1 routes.
+
+A page is written straight into one string, a column at a time: each selected field is
+pulled from every row, turned into JSON text with the json module's C string encoder
+(numbers go in as they are), and the rows are then filled into one `%` template for the
+field selection. No dict is built per row and nothing walks the result again as
+`json.dumps` would. Names and messages are stored HTML-escaped; like an export, the API
+returns the plain text.
+"""
+import html
+from functools import lru_cache
+from itertools import repeat
+from json.encoder import encode_basestring
+
+FIELDS = ("id", "name", "message", "created_at", "timestamp")
+KINDS = {"id": "number", "name": "text", "message": "text", "created_at": "number", "timestamp": "string"}
+
+def parse_fields(value):
+    "The fields selected by a comma-separated `fields=` value, all of them when it is empty."
+    if not value or not value.strip():
+        return FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    if not fields or not set(fields) <= set(KINDS):
+        raise ValueError(f"fields must be a comma-separated subset of {','.join(FIELDS)}")
+    return fields
+
+def parse_ids(value, limit):
+    "Message ids from a comma-separated `ids=` value, at most `limit` of them."
+    try:
+        ids = tuple(dict.fromkeys(int(i) for i in value.split(",") if i.strip()))
+    except ValueError:
+        raise ValueError("ids must be comma-separated integers") from None
+    if not ids or len(ids) > limit:
+        raise ValueError(f"Give between 1 and {limit} ids")
+    return ids
+
+@lru_cache(maxsize=64)
+def _template(fields):
+    return "{" + ",".join(f'"{field}":%s' for field in fields) + "}"
+
+def _column(values, kind):
+    "A column as JSON text, except numbers, which `%s` writes the same way."
+    if None in values:
+        if kind == "number":
+            return ["null" if v is None else v for v in values]
+        return ["null" if v is None else encode_basestring(html.unescape(v) if kind == "text" else v) for v in values]
+    if kind == "number":
+        return values
+    return list(map(encode_basestring, map(html.unescape, values) if kind == "text" else values))
+
+def encode_rows(rows, fields):
+    "`rows` as comma-separated JSON objects with just `fields`."
+    columns = [_column(list(map(dict.get, rows, repeat(field))), KINDS[field]) for field in fields]
+    template = _template(fields)
+    return ",".join([template % values for values in zip(*columns)])
+
+def encode_messages(rows, fields, next_cursor=None, stale=False):
+    'A page as UTF-8 JSON, `{"data": [...], "next_cursor": id or null}`, plus `"stale": true` for a saved copy.'
+    body = '{"data":[' + encode_rows(rows, fields) + '],"next_cursor":' + ("null" if next_cursor is None else str(next_cursor))
+    return (body + (',"stale":true}' if stale else "}")).encode()
@@ -0,0 +1,138 @@
+"""
+Static asset pipeline.
+
+Copies everything under `assets/` to content-hashed names (`style.<hash>.css`), writes
+gzip/brotli siblings for text assets and derives right-sized icon and image variants,
+then records the result in `manifest.json`. The app looks URLs up through `asset_url`
+and serves the build directory with `Cache-Control: immutable`.
+
+Run it as a build step with `python assets.py` (the build directory isn't in git). The
+app never builds: it only reads the manifest, and uses it when the hashes it records still
+match the sources; otherwise plain `/assets/` URLs are served. Brotli and Pillow are
+optional, without them the `.br` files and image variants are skipped.
+"""
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import os
+import shutil
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+TEXT_EXTS = {".css", ".js", ".svg", ".json", ".txt"}
+# name -> (source, size in px, format)
+VARIANTS = {
+    "favicon.ico": ("me.ico", (16, 32, 48), "ICO"),
+    "favicon-32.png": ("me.png", 32, "PNG"),
+    "apple-touch-icon.png": ("me.png", 180, "PNG"),
+    "me-512.png": ("me.png", 512, "PNG"),
+    "me-512.webp": ("me.png", 512, "WEBP"),
+}
+
+def _hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def _fingerprint(name, data):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{_hash(data)}{ext}"
+
+def _source_files(src_dir):
+    return sorted(f for f in os.listdir(src_dir) if os.path.isfile(os.path.join(src_dir, f)))
+
+def _source_state(src_dir):
+    "Names and content hashes of the sources; unlike mtimes these survive a fresh checkout."
+    state = []
+    for f in _source_files(src_dir):
+        with open(os.path.join(src_dir, f), "rb") as fh:
+            state.append([f, _hash(fh.read())])
+    return state
+
+def _optional(module):
+    "Import an optional build dependency; only the build needs them, never the app."
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        return None
+
+def _render_variant(Image, src_path, size, fmt):
+    with Image.open(src_path) as im:
+        im = im.convert("RGBA")
+        out = io.BytesIO()
+        if fmt == "ICO":
+            im.save(out, format="ICO", sizes=[(s, s) for s in size])
+        else:
+            im = im.resize((size, size), Image.LANCZOS)
+            if fmt == "PNG":
+                im.save(out, format=fmt, optimize=True)
+            else:
+                im.save(out, format=fmt, quality=85)
+        return out.getvalue()
+
+def _write(out_dir, name, data):
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path): # Content-addressed, an existing file is already right
+        with open(path, "wb") as f:
+            f.write(data)
+
+def build_assets(src_dir=SRC_DIR, out_dir=None):
+    "Build fingerprinted, precompressed assets into `out_dir` and return the manifest."
+    out_dir = out_dir or os.path.join(src_dir, "build")
+    os.makedirs(out_dir, exist_ok=True)
+    brotli, Image = _optional("brotli"), _optional("PIL.Image")
+    files = {}
+    for name in _source_files(src_dir):
+        with open(os.path.join(src_dir, name), "rb") as f:
+            files[name] = f.read()
+    if Image is not None:
+        for name, (src, size, fmt) in VARIANTS.items():
+            if src in files:
+                files[name] = _render_variant(Image, os.path.join(src_dir, src), size, fmt)
+
+    assets = {}
+    for name, data in files.items():
+        hashed = _fingerprint(name, data)
+        _write(out_dir, hashed, data)
+        encodings = []
+        if os.path.splitext(name)[1] in TEXT_EXTS:
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                _write(out_dir, hashed + ".gz", gz)
+                encodings.append("gzip")
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data):
+                    _write(out_dir, hashed + ".br", br)
+                    encodings.append("br")
+        assets[name] = {"file": hashed, "encodings": encodings}
+
+    manifest = {"source": _source_state(src_dir), "assets": assets}
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+def load_assets(src_dir=SRC_DIR, out_dir=None):
+    """Return `(build_dir, manifest)` from the last `python assets.py`.
+
+    Nothing is built here. Without a manifest, or with one whose hashes no longer match
+    the sources, returns `(None, None)` and the app uses plain `/assets/` URLs.
+    """
+    build_dir = out_dir or os.path.join(src_dir, "build")
+    try:
+        with open(os.path.join(build_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if manifest.get("source") != _source_state(src_dir):
+        print("Assets changed since the last build, serving them unversioned; run `python assets.py`")
+        return None, None
+    return build_dir, manifest
+
+def clean(src_dir=SRC_DIR):
+    shutil.rmtree(os.path.join(src_dir, "build"), ignore_errors=True)
+
+if __name__ == "__main__":
+    clean()
+    manifest = build_assets()
+    for name, info in manifest["assets"].items():
+        print(f"{name:24} -> {info['file']}  {' '.join(info['encodings'])}")
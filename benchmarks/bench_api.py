@@ -0,0 +1,82 @@
+"""
+JSON API against the HTML route: req/s for a page of messages from `/messages` (HTMX
+fragment) and `/api/v1/messages` (all fields, and just `id,message`), plus a full walk of
+--messages rows by cursor. Page caching and coalescing are off, so every request reads
+SQLite and serializes. Also times the row encoder against `json.dumps` of per-row dicts.
+
+    python benchmarks/bench_api.py --messages 2000 --requests 500 --limit 10 100
+"""
+import argparse
+import asyncio
+import html
+import json
+import time
+
+import httpx
+from common import fake_rows, import_app, seed
+
+main = import_app(GUESTBOOK_PAGE_CACHE_SIZE=0, GUESTBOOK_COALESCE=0)
+from api import FIELDS, encode_messages
+
+async def req_per_s(client, url, requests, headers=None):
+    start = time.perf_counter()
+    for _ in range(requests):
+        r = await client.get(url, headers=headers)
+        assert r.status_code == 200
+    return requests / (time.perf_counter() - start)
+
+async def walk(client, url, cursor_of):
+    "Seconds to read every page by cursor, and how many pages that took."
+    start, pages, cursor = time.perf_counter(), 0, None
+    while True:
+        r = await client.get(url + ("" if cursor is None else f"&before={cursor}"), headers={"hx-request": "1"})
+        pages += 1
+        cursor = cursor_of(r)
+        if cursor is None:
+            return time.perf_counter() - start, pages
+
+def html_cursor(r):
+    return int(r.text.split('hx-get="/messages?before=')[1].split('"')[0]) if "hx-get=\"/messages?before=" in r.text else None
+
+def encoder_us(rows, repeat=200):
+    def dumps(rows):
+        return json.dumps({"data": [{"id": r["id"], "name": html.unescape(r["name"]), "message": html.unescape(r["message"]),
+                                     "created_at": r["created_at"], "timestamp": r.get("timestamp")} for r in rows],
+                           "next_cursor": None}, ensure_ascii=False).encode()
+    timings = []
+    for fn in (dumps, lambda rows: encode_messages(rows, FIELDS)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(rows)
+        timings.append((time.perf_counter() - start) * 1e6 / repeat)
+    return timings
+
+async def main_async(args):
+    seed(main, args.messages)
+    main.guestbook_stats.reconcile()
+    per_page = main.MESSAGES_PER_PAGE # The HTML route's fixed page size
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        routes = {f"html /messages ({per_page})": ("/messages?page=1", {"hx-request": "1"})}
+        for limit in args.limit:
+            routes[f"api all fields ({limit})"] = (f"/api/v1/messages?limit={limit}", None)
+            routes[f"api id,message ({limit})"] = (f"/api/v1/messages?limit={limit}&fields=id,message", None)
+        for label, (url, headers) in routes.items():
+            await req_per_s(client, url, 10, headers) # Warm up
+            print(f"{label:24} {await req_per_s(client, url, args.requests, headers):8.1f} req/s")
+        main.fragment_cache.invalidate()
+        elapsed, pages = await walk(client, "/messages?page=1", html_cursor)
+        print(f"walk {args.messages} rows  html ({per_page})  {elapsed*1000:8.1f} ms  {pages:4} pages (cold cards)")
+        for limit in args.limit:
+            elapsed, pages = await walk(client, f"/api/v1/messages?limit={limit}", lambda r: r.json()["next_cursor"])
+            print(f"walk {args.messages} rows  api ({limit:>3})  {elapsed*1000:8.1f} ms  {pages:4} pages")
+        for limit in args.limit:
+            dumps, encoder = encoder_us(fake_rows(limit))
+            print(f"serialize {limit:>3} rows  json.dumps {dumps:7.1f} us  encode_messages {encoder:7.1f} us  ({dumps / encoder:3.1f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--limit", type=int, nargs="+", default=[10, 100])
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,50 @@
+"""
+Bulk import and export throughput, e.g. for a 1M-row guestbook.
+
+Writes an NDJSON file of --rows synthetic messages, imports it into a fresh SQLite
+backend through the submission validator, then exports it again. Peak RSS is printed
+after each phase; export memory should not grow with --rows.
+
+    python benchmarks/bench_bulk.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+
+from common import import_app
+
+main = import_app(GUESTBOOK_METRICS=0)
+from bulk import import_records, iter_export, read_records
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def write_dataset(path, n):
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"name": f"Visitor {i % 5000}", "message": f"Hello number {i} & thanks <3", "created_at": 1700000000 + i}) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+    path = os.path.join(tempfile.mkdtemp(prefix="guestbook-bulk-"), "dump.ndjson")
+    write_dataset(path, args.rows)
+
+    start = time.perf_counter()
+    inserted, _ = import_records(main.store, read_records(path), main.prepare_message, batch=args.batch, log=lambda m: None)
+    elapsed = time.perf_counter() - start
+    print(f"import  {inserted:>9} rows  {elapsed:7.2f} s  {inserted / elapsed:10.0f} rows/s  peak RSS {peak_rss_mb():7.1f} MiB")
+
+    start = time.perf_counter()
+    exported = 0
+    with open(os.devnull, "w") as out:
+        for chunk in iter_export(main.store, chunk_size=1000):
+            exported += chunk.count("\n")
+            out.write(chunk)
+    elapsed = time.perf_counter() - start
+    print(f"export  {exported:>9} rows  {elapsed:7.2f} s  {exported / elapsed:10.0f} rows/s  peak RSS {peak_rss_mb():7.1f} MiB")
@@ -0,0 +1,53 @@
+"""
+Thundering herd on `/` and `/messages?page=1`: bursts of --clients simultaneous requests
+against a cold page cache and a backend that takes --latency seconds per query. Reports
+backend fetches, burst duration and req/s with single-flight coalescing off and on.
+
+    python benchmarks/bench_coalesce.py --clients 100 500 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from common import fake_rows, import_app
+
+main = import_app(GUESTBOOK_PAGE_CACHE_SIZE=0, GUESTBOOK_COALESCE_TTL=0) # Every burst starts cold
+
+def slow_fetch(latency, calls):
+    rows = fake_rows(main.MESSAGES_PER_PAGE + 1)
+    def fetch(limit, before=None, offset=0):
+        calls.append(1)
+        time.sleep(latency) # Blocking, like the real PostgREST round-trip
+        return rows[:limit]
+    return fetch
+
+async def burst(client, url, clients):
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(client.get(url, headers={"hx-request": "1"} if "messages" in url else {})
+                                       for _ in range(clients)))
+    assert all(r.status_code == 200 for r in responses)
+    return time.perf_counter() - start
+
+async def main_async(args):
+    calls = []
+    main.store.fetch = slow_fetch(args.latency, calls)
+    main.guestbook_stats.reconcile()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await burst(client, "/", 1) # Page shell and latest id
+        print(f"latency={args.latency*1000:.0f}ms workers={main.DB_WORKERS}")
+        for url in ("/", "/messages?page=1"):
+            for clients in args.clients:
+                for coalesce in (False, True):
+                    main.COALESCE = coalesce
+                    calls.clear()
+                    elapsed = await burst(client, url, clients)
+                    print(f"{url:18} clients={clients:>5} coalesce={'on ' if coalesce else 'off'}  "
+                          f"fetches {len(calls):5}  {elapsed*1000:8.1f} ms  {clients/elapsed:8.1f} req/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--latency", type=float, default=0.05)
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,51 @@
+"""
+Concurrency benchmark for the async routes.
+
+Simulates a backend round-trip of --latency seconds inside `_fetch_messages` and fires
+requests at `/messages` with an increasing number of in-flight requests. With the
+blocking client on the event loop throughput stays flat at ~1/latency; with the
+executor it should grow with concurrency up to GUESTBOOK_DB_WORKERS.
+
+    python benchmarks/bench_concurrency.py --latency 0.05 --requests 200
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from common import fake_rows, import_app
+
+main = import_app(GUESTBOOK_PAGE_CACHE_SIZE=0, GUESTBOOK_COALESCE=0) # Every request must reach the (slow) backend
+
+def slow_fetch_messages(latency):
+    rows = fake_rows(main.MESSAGES_PER_PAGE)
+    def fetch_messages(page, per_page, before=None):
+        time.sleep(latency) # Blocking, like the real PostgREST round-trip
+        return {'data': rows, 'current_page': page, 'per_page': per_page, 'total_fetched': len(rows), 'has_more': True, 'next_cursor': rows[-1]['id']}
+    return fetch_messages
+
+async def run_level(client, concurrency, total):
+    sem = asyncio.Semaphore(concurrency)
+    async def one():
+        async with sem:
+            r = await client.get("/messages?page=1", headers={"hx-request": "1"})
+            r.raise_for_status()
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+async def main_async(args):
+    main._fetch_messages = slow_fetch_messages(args.latency)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"latency={args.latency*1000:.0f}ms workers={main.DB_WORKERS}")
+        for c in args.levels:
+            rps = await run_level(client, c, args.requests)
+            print(f"concurrency={c:>3}  {rps:8.1f} req/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    asyncio.run(main_async(parser.parse_args()))
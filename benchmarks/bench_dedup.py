@@ -0,0 +1,29 @@
+"""
+Cost of the duplicate check per submission.
+
+    python benchmarks/bench_dedup.py --submissions 100000
+"""
+import argparse
+import time
+
+import common  # noqa: F401 (puts the repo on sys.path)
+from dedup import DuplicateFilter
+
+def us_per_claim(f, messages):
+    start = time.perf_counter()
+    for i, message in enumerate(messages):
+        f.claim(f"Visitor {i % 1000}", message)
+    return (time.perf_counter() - start) * 1e6 / len(messages)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--submissions", type=int, default=100000)
+    args = parser.parse_args()
+    messages = [f"Hello number {i}, what a lovely site, keep up the great work!" for i in range(args.submissions)]
+    for near in (0, 3):
+        f = DuplicateFilter(near_distance=near)
+        fresh = us_per_claim(f, messages)
+        repeat = us_per_claim(f, messages)
+        stats = f.stats()
+        print(f"near_distance={near}  new {fresh:6.2f} us/claim  duplicate {repeat:6.2f} us/claim"
+              f"  dropped {stats['duplicates'] + stats['near_duplicates']:7}  bloom {stats['bloom_bytes'] / 1024:.0f} KiB")
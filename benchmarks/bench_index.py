@@ -0,0 +1,34 @@
+"""
+Per-request cost of `GET /`: whole FT page vs. pre-built page shell.
+
+Messages come from the (warm) page and fragment caches, so the numbers are the CPU
+spent building and serializing the page.
+
+    python benchmarks/bench_index.py --requests 500
+"""
+import argparse
+import time
+
+from common import import_app, seed
+
+main = import_app()
+from starlette.testclient import TestClient
+
+def ms_per_request(client, n):
+    client.get("/") # Warm up caches and the shell
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get("/")
+    return (time.perf_counter() - start) * 1000 / n
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    seed(main, 50)
+    client = TestClient(main.app)
+    main.PAGE_SHELL = False
+    ft = ms_per_request(client, args.requests)
+    main.PAGE_SHELL = True
+    shell = ms_per_request(client, args.requests)
+    print(f"GET /  ft page: {ft:.3f} ms/request  page shell: {shell:.3f} ms/request  ({ft / shell:.1f}x)")
@@ -0,0 +1,66 @@
+"""
+Read latency under a write flood, with and without the per-client rate limiter.
+
+Runs the app under uvicorn; a few flooding clients post to /submit-message at a fixed
+rate each while readers fetch /messages. Reports reader p50/p95/p99 and how many
+writes reached the backend.
+
+The flood is paced so both flood runs offer the server the same load: a 429 answers
+sooner than an insert, so unpaced flooders would just send more of them. Over-limit
+posts are rejected before routing, but each still costs a request's worth of socket
+and ASGI work, so reads don't stay flat when server and clients share a core. Measured
+on one core, 15 s runs: no flood p50 17 ms, p99 85 ms; flood with no limit p50 37 ms,
+p99 285 ms; flood, limited p50 30 ms, p99 200 ms (43 ms p50 when 429s went through
+routing).
+
+    python benchmarks/bench_ratelimit.py --seconds 15 --flooders 8 --flood-rate 25 --readers 8
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from common import serve_app
+
+def percentile(samples, p):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))] if samples else float("nan")
+
+async def flooder(client, ip, stop, counts, rate):
+    interval, due = 1 / rate, time.perf_counter()
+    while not stop.is_set():
+        n = sum(counts.values()) # Distinct texts, so the duplicate filter doesn't drop them
+        r = await client.post("/submit-message", data={"name": "Spammer", "message": f"Buy now {ip} {n}"},
+                              headers={"x-forwarded-for": ip, "hx-request": "1"})
+        counts[r.status_code] = counts.get(r.status_code, 0) + 1
+        due += interval
+        await asyncio.sleep(max(0, due - time.perf_counter()))
+
+async def reader(client, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        r = await client.get("/messages?page=2", headers={"hx-request": "1"})
+        r.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+async def run(url, args, flooders):
+    stop, latencies, counts = asyncio.Event(), [], {}
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=httpx.Limits(max_connections=None)) as client:
+        tasks = [asyncio.create_task(reader(client, stop, latencies)) for _ in range(args.readers)]
+        tasks += [asyncio.create_task(flooder(client, f"10.0.0.{i}", stop, counts, args.flood_rate)) for i in range(flooders)]
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return latencies, counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--flooders", type=int, default=8)
+    parser.add_argument("--flood-rate", type=float, default=25, help="Posts per second from each flooder")
+    parser.add_argument("--readers", type=int, default=8)
+    args = parser.parse_args()
+    for label, limit, flooders in [("no flood", 0, 0), ("flood, no limit", 0, args.flooders), ("flood, limited", 6, args.flooders)]:
+        with serve_app(messages=1000, GUESTBOOK_TRUST_PROXY=1, GUESTBOOK_RATE_LIMIT=limit) as url:
+            latencies, counts = asyncio.run(run(url, args, flooders))
+        print(f"{label:16}  reads {len(latencies):6}  p50 {percentile(latencies, 0.5):7.2f} ms  p95 {percentile(latencies, 0.95):7.2f} ms"
+              f"  p99 {percentile(latencies, 0.99):7.2f} ms  writes accepted {counts.get(200, 0):6}  rejected {counts.get(429, 0):6}")
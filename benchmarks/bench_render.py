@@ -0,0 +1,49 @@
+"""
+Page render cost: full FT tree per message vs. joined per-message fragments, and the
+cost of rendering one card cold (a fragment cache miss): FT tree plus to_xml vs. the
+string-built render_message_fast.
+
+    python benchmarks/bench_render.py --sizes 10 100 1000
+"""
+import argparse
+import time
+
+from common import fake_rows, import_app
+
+main = import_app()
+from fasthtml.common import NotStr, to_xml
+
+def ft_page(rows):
+    return to_xml(tuple(main.render_message(entry) for entry in rows))
+
+def fragment_page(rows):
+    return to_xml(tuple(NotStr(main.render_message_html(entry)) for entry in rows))
+
+def us_per_card(fn, rows, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for entry in rows:
+            fn(entry)
+    return (time.perf_counter() - start) * 1e6 / (repeat * len(rows))
+
+def ms_per_page(fn, rows, repeat):
+    fn(rows) # Warm up (and fill the fragment cache)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(rows)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    for n in args.sizes:
+        rows = fake_rows(n)
+        ft = ms_per_page(ft_page, rows, args.repeat)
+        cached = ms_per_page(fragment_page, rows, args.repeat)
+        print(f"{n:>5} messages  ft: {ft:8.3f} ms/page  fragments: {cached:8.3f} ms/page  ({ft / cached:5.1f}x)")
+    rows = fake_rows(max(args.sizes))
+    ft = us_per_card(lambda entry: to_xml(main.render_message(entry)), rows, args.repeat)
+    fast = us_per_card(main.render_message_fast, rows, args.repeat)
+    print(f"cold card  ft + to_xml: {ft:7.2f} us  render_message_fast: {fast:7.2f} us  ({ft / fast:5.1f}x)")
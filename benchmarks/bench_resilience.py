@@ -0,0 +1,75 @@
+"""
+Backend outage behaviour: a local fake PostgREST server answers the Supabase store
+normally, then with injected latency, then not at all (every request hangs past the
+timeout). Reports per-call latency and failures for the bare store and for the
+ResilientStore the app uses, whose open circuit answers without touching the network.
+
+    python benchmarks/bench_resilience.py --calls 50 --timeout 0.5
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import ROOT # noqa: F401 (puts the app on sys.path)
+from resilience import CircuitBreaker, ResilientStore
+from storage import SupabaseStore
+
+ROWS = json.dumps([{"id": i, "name": f"Visitor {i}", "message": "Hello", "created_at": 1735700000 + i}
+                   for i in range(11, 0, -1)]).encode()
+
+def fake_postgrest():
+    state = {"delay": 0.0, "fault_rate": 0.0, "n": 0}
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep-alive, like the real API
+        disable_nagle_algorithm = True
+        def do_GET(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0))) # postgrest sends `{}` with GETs
+            state["n"] += 1
+            time.sleep(state["delay"])
+            fail = state["fault_rate"] and state["n"] % round(1 / state["fault_rate"]) == 0
+            body = b'{"message": "unavailable"}' if fail else ROWS
+            self.send_response(503 if fail else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.handle_error = lambda request, address: None # Clients hang up on timed-out requests
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+def run(store, calls):
+    latencies, failures = [], 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            store.fetch(11)
+        except Exception:
+            failures += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    args = parser.parse_args()
+    server, state = fake_postgrest()
+    url = f"http://127.0.0.1:{server.server_port}"
+    scenarios = {"healthy": (0.0, 0.0), "10% faults": (0.0, 0.1), "slow (100 ms)": (0.1, 0.0),
+                 "down (hangs)": (args.timeout * 4, 0.0)}
+    for label, make in [("bare store", lambda: SupabaseStore(url, "header.payload.signature", timeout=args.timeout)),
+                        ("resilient store", lambda: ResilientStore(SupabaseStore(url, "header.payload.signature", timeout=args.timeout),
+                                                                   CircuitBreaker(failures=5, reset_after=30)))]:
+        store = make()
+        for scenario, (delay, fault_rate) in scenarios.items():
+            state.update(delay=delay, fault_rate=fault_rate, n=0)
+            p50, p99, failures = run(store, args.calls)
+            print(f"{label:16} {scenario:14} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  failed {failures:3}/{args.calls}")
+    server.shutdown()
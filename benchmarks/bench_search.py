@@ -0,0 +1,56 @@
+"""
+Search index build time, memory and query latency on a synthetic corpus.
+
+Words are drawn from a Zipf-like distribution over a fixed vocabulary, so a few words
+are in most messages and most words are rare, like real text.
+
+    python benchmarks/bench_search.py --sizes 10000 100000 1000000
+"""
+import argparse
+import itertools
+import random
+import time
+import tracemalloc
+
+import common  # noqa: F401 (puts the repo on sys.path)
+from search import SearchIndex
+
+VOCAB = [f"w{i}" for i in range(50000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (i + 1) for i in range(len(VOCAB))))
+
+def corpus(n, rng):
+    for i in range(1, n + 1):
+        words = rng.choices(VOCAB, cum_weights=CUM_WEIGHTS, k=rng.randint(5, 30))
+        yield {"id": i, "name": f"Visitor {i % 5000}", "message": " ".join(words)}
+
+def percentile(samples, p):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))]
+
+def run(n, queries):
+    rng = random.Random(n)
+    index = SearchIndex()
+    tracemalloc.start()
+    start = time.perf_counter()
+    index.build(corpus(n, rng))
+    build = time.perf_counter() - start
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    latencies = []
+    for _ in range(queries):
+        words = rng.choices(VOCAB, cum_weights=CUM_WEIGHTS, k=rng.randint(1, 3))
+        query = " ".join(words)[:-1] if rng.random() < 0.5 else " ".join(words) # Half are typed-so-far prefixes
+        start = time.perf_counter()
+        index.search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"{n:>9} messages  build {build:6.2f} s  index {index.memory_bytes() / 2**20:7.1f} MiB"
+          f" (traced {traced / 2**20:7.1f} MiB)  query p50 {percentile(latencies, 0.5):7.3f} ms"
+          f"  p95 {percentile(latencies, 0.95):7.3f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    for n in args.sizes:
+        run(n, args.queries)
@@ -0,0 +1,50 @@
+"""
+Cost of idle live-feed connections and of one fan-out.
+
+Subscribes --clients consumers to a FeedHub, reports memory per idle connection and
+how long one published message takes to reach all of them.
+
+    python benchmarks/bench_sse.py --clients 1000 5000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from common import ROOT # noqa: F401 (puts the repo on sys.path)
+from feed import FeedHub
+
+async def run(n):
+    hub = FeedHub(buffer_size=32)
+    received = asyncio.Event()
+    remaining = n
+    async def client():
+        nonlocal remaining
+        async for chunk in hub.events(keepalive=3600):
+            if chunk.startswith("event:"):
+                remaining -= 1
+                if remaining == 0:
+                    received.set()
+                return
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [asyncio.create_task(client()) for _ in range(n)]
+    while hub.client_count() < n:
+        await asyncio.sleep(0.01)
+    per_client = (tracemalloc.get_traced_memory()[0] - before) / n
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    hub.publish('<div class="message-card">hello</div>')
+    await received.wait()
+    elapsed = (time.perf_counter() - start) * 1000
+    await asyncio.gather(*tasks)
+    print(f"{n:>6} clients  {per_client / 1024:6.2f} KiB/idle client  fan-out to all: {elapsed:7.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+    for n in args.clients:
+        asyncio.run(run(n))
@@ -0,0 +1,83 @@
+"""
+Cold-start cost: how long `import main` takes, which modules dominate it, and the time
+from spawning uvicorn to the first successful response. Each figure is the median of
+--runs fresh processes; --json writes them in the shape `compare.py` reads.
+
+    python benchmarks/bench_startup.py --runs 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from common import ROOT
+
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def child_env(backend):
+    path = os.path.join(tempfile.mkdtemp(prefix="guestbook-bench-"), "guestbook.db")
+    env = {**os.environ, "GUESTBOOK_BACKEND": backend, "GUESTBOOK_SQLITE_PATH": path}
+    if backend == "supabase": # Never contacted at import; the client is created on first use
+        env.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+        env.setdefault("SUPABASE_KEY", "bench")
+    return env
+
+def import_profile(backend):
+    "(total import seconds, {top-level module: cumulative seconds}) for one fresh `import main`."
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                         env=child_env(backend), capture_output=True, text=True, check=True).stderr
+    modules = {}
+    for line in out.splitlines():
+        m = IMPORTTIME.match(line)
+        if m and len(m.group(3)) <= 3: # The interpreter's own imports, main and what main imports directly
+            modules[m.group(4)] = int(m.group(2)) / 1e6
+    return modules.get("main", 0.0), modules
+
+def first_response(backend, port):
+    "Seconds from spawning uvicorn to the first 200 from /messages."
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=ROOT, env=child_env(backend))
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/messages", timeout=5).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited before answering")
+            time.sleep(0.005)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for backend in ("sqlite", "supabase"):
+        profiles = [import_profile(backend) for _ in range(args.runs)]
+        results[f"import main ({backend})"] = statistics.median(total for total, _ in profiles)
+        print(f"import main, {backend} backend: {results[f'import main ({backend})'] * 1000:.1f} ms")
+        modules = {name: statistics.median(p[1].get(name, 0.0) for p in profiles) for name in profiles[0][1]}
+        for name, seconds in sorted(modules.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {name:32} {seconds * 1000:8.1f} ms")
+    # Only sqlite can answer a request without a reachable Supabase project
+    results["first response (sqlite)"] = statistics.median(first_response("sqlite", args.port) for _ in range(args.runs))
+    print(f"spawn to first response, sqlite backend: {results['first response (sqlite)'] * 1000:.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": {"runs": args.runs, "python": sys.version.split()[0]},
+                       "micro": {name: {"us_per_op": round(s * 1e6, 1)} for name, s in results.items()}}, f, indent=1)
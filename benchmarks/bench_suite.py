@@ -0,0 +1,119 @@
+"""
+Benchmark suite: rendering/data micro-benchmarks plus an in-process load test.
+
+Seeds a throwaway SQLite backend with --messages rows, times the hot functions, then
+drives the ASGI app through httpx at each --levels concurrency and reports p50/p95/p99
+latency and requests per second per route. Results go to stdout and, with --json, to
+a file that `compare.py` can diff against an earlier run.
+
+    python benchmarks/bench_suite.py --messages 1000 --json before.json
+    python benchmarks/compare.py before.json after.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import subprocess
+import time
+import timeit
+
+import httpx
+from common import ROOT, import_app, seed
+
+main = import_app(GUESTBOOK_RATE_LIMIT=0, GUESTBOOK_DEDUP_WINDOW=0) # Let the write load through
+from fasthtml.common import to_xml
+
+def percentile(samples, p):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))]
+
+def micro(fn, repeat=5, min_time=0.2):
+    "Best-of-`repeat` microseconds per call of `fn`."
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat, number)) * 1e6 / number
+
+def micro_benchmarks():
+    entry = main.store.fetch(1)[0]
+    messages_info = main.get_messages(page=1)
+    results = {
+        "render_message": micro(lambda: to_xml(main.render_message(entry))),
+        "render_message_html (cached)": micro(lambda: main.render_message_html(entry)),
+        "render_message_list_content": micro(lambda: to_xml(main.render_message_list_content(page=1, messages_info=messages_info))),
+        "get_messages (cached)": micro(lambda: main.get_messages(page=1)),
+    }
+    main.page_cache.maxsize, size = 0, main.page_cache.maxsize
+    main.page_cache.invalidate()
+    results["get_messages (backend)"] = micro(lambda: main.get_messages(page=1))
+    main.page_cache.maxsize = size
+    return {name: {"us_per_op": round(us, 3)} for name, us in results.items()}
+
+def route_requests(cursor):
+    "Request factories per route; each call returns (method, url, kwargs)."
+    sent = itertools.count()
+    hx = {"headers": {"hx-request": "1"}}
+    return {
+        "GET /": lambda: ("GET", "/", {}),
+        "GET /messages": lambda: ("GET", "/messages?page=1", hx),
+        "GET /messages?before": lambda: ("GET", f"/messages?before={cursor}", hx),
+        "POST /submit-message": lambda: ("POST", "/submit-message",
+                                         {"data": {"name": "Load Test", "message": f"Message {next(sent)}"}, **hx}),
+    }
+
+async def load_level(client, make_request, concurrency, total):
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+    async def one():
+        method, url, kwargs = make_request()
+        async with sem:
+            start = time.perf_counter()
+            r = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            r.raise_for_status()
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    return {"rps": round(total / elapsed, 1), "p50_ms": round(percentile(latencies, 0.5), 3),
+            "p95_ms": round(percentile(latencies, 0.95), 3), "p99_ms": round(percentile(latencies, 0.99), 3)}
+
+async def load_test(levels, total):
+    cursor = main.get_messages(page=1)['next_cursor']
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for route, make_request in route_requests(cursor).items():
+            await load_level(client, make_request, 1, min(total, 20)) # Warm up caches and the page shell
+            results[route] = {str(c): await load_level(client, make_request, c, total) for c in levels}
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=300, help="Requests per route and concurrency level")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+    seed(main, args.messages)
+    main.guestbook_stats.reconcile()
+
+    results = {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "machine": platform.machine(),
+                 "messages": args.messages, "requests": args.requests, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "micro": micro_benchmarks(),
+        "load": asyncio.run(load_test(args.levels, args.requests)),
+    }
+    for name, r in results["micro"].items():
+        print(f"{name:32} {r['us_per_op']:10.2f} us/op")
+    for route, levels in results["load"].items():
+        for c, r in levels.items():
+            print(f"{route:24} c={c:>3}  {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.2f}  p95 {r['p95_ms']:7.2f}  p99 {r['p99_ms']:7.2f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
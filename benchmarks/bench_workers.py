@@ -0,0 +1,86 @@
+"""
+Multi-worker scaling with and without the shared cache.
+
+Starts 1..N uvicorn workers (one process per port, all on the same SQLite database and
+backend latency of --latency seconds per read) and spreads a mix of page reads and a
+few submissions across them. Reports req/s, how many reads reached the backend, and
+the local and shared cache hit rates summed from every worker's /metrics.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --requests 2000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import re
+import tempfile
+import time
+from contextlib import ExitStack
+
+import httpx
+from common import seed_sqlite, serve_app
+
+METRIC = re.compile(r'^(guestbook_[a-z_]+)(\{[^}]*\})? ([0-9.e+-]+)$', re.M)
+
+def scrape(urls):
+    "Sum each metric line (name plus labels) over every worker."
+    totals = {}
+    for url in urls:
+        for name, labels, value in METRIC.findall(httpx.get(url + "/metrics").text):
+            totals[name + labels] = totals.get(name + labels, 0) + float(value)
+    return totals
+
+async def load(urls, total, concurrency, pages, write_ratio):
+    rng = random.Random(1)
+    sent = itertools.count()
+    sem = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=60) as client:
+        async def one(i):
+            url = urls[i % len(urls)]
+            async with sem:
+                if rng.random() < write_ratio:
+                    r = await client.post(url + "/submit-message", data={"name": "Bench", "message": f"Worker message {next(sent)}"},
+                                          headers={"hx-request": "1"})
+                else:
+                    page = min(pages, int(rng.paretovariate(1.2))) # Most visitors stay on the first pages
+                    r = await client.get(f"{url}/messages?page={page}", headers={"hx-request": "1"})
+                r.raise_for_status()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return total / (time.perf_counter() - start)
+
+def run(workers, shared, args, db):
+    env = {"GUESTBOOK_BENCH_LATENCY": args.latency, "GUESTBOOK_RATE_LIMIT": 0, "GUESTBOOK_DEDUP_WINDOW": 0,
+           "GUESTBOOK_COALESCE_TTL": 0}
+    if shared:
+        env["GUESTBOOK_SHARED_CACHE"] = os.path.join(tempfile.mkdtemp(prefix="guestbook-bench-"), "cache.db")
+    with ExitStack() as stack:
+        urls = [stack.enter_context(serve_app(port=args.port + i, sqlite_path=db, app="benchmarks.latency_app:app", **env))
+                for i in range(workers)]
+        before = scrape(urls)
+        rps = asyncio.run(load(urls, args.requests, args.concurrency, args.pages, args.write_ratio))
+        after = scrape(urls)
+    delta = lambda key: after.get(key, 0) - before.get(key, 0)
+    fetches = delta('guestbook_backend_seconds_count{operation="fetch"}')
+    local = delta("guestbook_page_cache_hits_total"), delta("guestbook_page_cache_misses_total")
+    shared_hits, shared_misses = delta("guestbook_shared_cache_hits_total"), delta("guestbook_shared_cache_misses_total")
+    local_rate = local[0] / max(1, sum(local))
+    shared_rate = shared_hits / max(1, shared_hits + shared_misses)
+    print(f"workers={workers} shared={'on ' if shared else 'off'}  {rps:8.1f} req/s  backend fetches {fetches:6.0f}  "
+          f"local hit rate {local_rate:6.1%}  shared hit rate {shared_rate:6.1%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--write-ratio", type=float, default=0.01)
+    parser.add_argument("--port", type=int, default=8770)
+    args = parser.parse_args()
+    db = seed_sqlite(args.pages * 10 + 10)
+    for workers in args.workers:
+        for shared in (False, True):
+            run(workers, shared, args, db)
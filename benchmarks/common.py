@@ -0,0 +1,61 @@
+"""Shared helpers for the benchmark scripts: import the app against a throwaway SQLite backend."""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def fake_rows(n, start=1):
+    "`n` synthetic guestbook rows, newest (highest id) first."
+    return [{"id": i, "name": f"Visitor {i}", "message": f"Hello number {i}, lovely site!", "created_at": 1735700000 + i}
+            for i in range(start + n - 1, start - 1, -1)]
+
+def import_app(**env):
+    "Import `main` with a fresh SQLite database; extra `env` overrides GUESTBOOK_* settings."
+    os.environ["GUESTBOOK_BACKEND"] = "sqlite"
+    os.environ["GUESTBOOK_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="guestbook-bench-"), "guestbook.db")
+    os.environ.update({k: str(v) for k, v in env.items()})
+    import main
+    return main
+
+def seed(main, n, batch=1000):
+    "Insert `n` messages through the store."
+    for start in range(0, n, batch):
+        rows = [{k: v for k, v in r.items() if k != "id"} for r in fake_rows(min(batch, n - start), start + 1)]
+        main.store.insert(rows)
+
+def seed_sqlite(messages, path=None):
+    "Path of a SQLite database (fresh unless `path` is given) holding `messages` synthetic rows."
+    from storage import SQLiteStore
+    path = path or os.path.join(tempfile.mkdtemp(prefix="guestbook-bench-"), "guestbook.db")
+    store = SQLiteStore(path)
+    for start in range(0, messages, 1000):
+        store.insert([{k: v for k, v in r.items() if k != "id"} for r in fake_rows(min(1000, messages - start), start + 1)])
+    return path
+
+@contextmanager
+def serve_app(port=8765, messages=0, sqlite_path=None, app="main:app", **env):
+    """Run the app under uvicorn in a subprocess against a fresh SQLite database holding
+    `messages` rows (or the existing `sqlite_path`); yields its base URL. Load over real
+    sockets keeps one side of the benchmark from starving the other on a shared event loop."""
+    path = sqlite_path or seed_sqlite(messages)
+    child_env = {**os.environ, "GUESTBOOK_BACKEND": "sqlite", "GUESTBOOK_SQLITE_PATH": path, **{k: str(v) for k, v in env.items()}}
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+                            cwd=ROOT, env=child_env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        import httpx
+        for _ in range(200):
+            try:
+                httpx.get(url + "/messages", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.05)
+        yield url
+    finally:
+        proc.terminate()
+        proc.wait()
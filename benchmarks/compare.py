@@ -0,0 +1,52 @@
+"""
+Compare two `bench_suite.py --json` result files and flag regressions.
+
+Prints every metric with its relative change; exits with status 1 when any of them got
+worse by more than --threshold (latencies and us/op up, requests per second down).
+
+    python benchmarks/compare.py before.json after.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+
+def metrics(results):
+    "Flatten results to {name: (value, higher_is_better)}."
+    out = {}
+    for name, r in results.get("micro", {}).items():
+        out[f"micro {name}"] = (r["us_per_op"], False)
+    for route, levels in results.get("load", {}).items():
+        for c, r in levels.items():
+            for key, value in r.items():
+                out[f"load {route} c={c} {key}"] = (value, key == "rps")
+    return out
+
+def compare(before, after, threshold):
+    "Rows of (name, before, after, change, regressed) for metrics present in both runs."
+    rows = []
+    old, new = metrics(before), metrics(after)
+    for name, (a, higher_is_better) in old.items():
+        if name not in new or not a:
+            continue
+        b = new[name][0]
+        change = (b - a) / a
+        regressed = (-change if higher_is_better else change) > threshold
+        rows.append((name, a, b, change, regressed))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change that counts as a regression")
+    args = parser.parse_args()
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    rows = compare(before, after, args.threshold)
+    for name, a, b, change, regressed in rows:
+        print(f"{name:60} {a:10.2f} -> {b:10.2f}  {change:+7.1%}{'  REGRESSION' if regressed else ''}")
+    regressions = sum(r[4] for r in rows)
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%} ({before['meta'].get('commit')} -> {after['meta'].get('commit')})")
+    sys.exit(1 if regressions else 0)
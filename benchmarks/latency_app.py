@@ -0,0 +1,24 @@
+"""`main:app` with GUESTBOOK_BENCH_LATENCY seconds added to every backend read, standing in
+for a remote database when benchmarks run it under uvicorn (`benchmarks.latency_app:app`)."""
+import os
+import time
+
+import main
+
+LATENCY = float(os.getenv("GUESTBOOK_BENCH_LATENCY", "0"))
+
+class SlowReads:
+    def __init__(self, store):
+        self.store = store
+
+    def __getattr__(self, name):
+        attr = getattr(self.store, name)
+        if name not in ("fetch", "max_id", "get_by_ids", "fetch_since"):
+            return attr
+        def slow(*args, **kwargs):
+            time.sleep(LATENCY) # Blocking, like the real PostgREST round trip
+            return attr(*args, **kwargs)
+        return slow
+
+main.resilient_store.store = SlowReads(main.resilient_store.store)
+app = main.app
@@ -0,0 +1,119 @@
+"""
+Bulk export and import of messages.
+
+Export walks the table by id one keyset chunk at a time and writes one JSON object per
+line, so memory stays flat however big the guestbook is. Names and messages are stored
+HTML-escaped; exports carry the plain text, which is what import expects, so an export
+can be imported again unchanged. Import reads NDJSON or CSV, runs every record through
+the same validation and escaping as a submission and inserts in large batches, saving a
+checkpoint after each one.
+"""
+import csv
+import html
+import json
+import os
+
+from storage import iter_rows
+from timestamps import parse_legacy
+
+EXPORT_FIELDS = ("id", "name", "message", "created_at", "timestamp")
+
+def export_line(row):
+    record = {k: row.get(k) for k in EXPORT_FIELDS}
+    record["name"], record["message"] = html.unescape(row["name"]), html.unescape(row["message"])
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+def iter_export(store, chunk_size=1000):
+    "NDJSON text, one chunk of lines per keyset chunk of the table."
+    chunk = []
+    for row in iter_rows(store, chunk_size=chunk_size):
+        chunk.append(export_line(row))
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+def read_records(path):
+    "Records from an NDJSON (`.ndjson`/`.jsonl`) or CSV file, streamed."
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield None # Rejected by import_records, which keeps counting positions
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+def write_checkpoint(path, done):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(str(done))
+    os.replace(tmp, path) # Atomic, a crash never leaves a half-written count
+
+def clear_checkpoint(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _record_row(record, prepare):
+    if not isinstance(record, dict):
+        raise TypeError("not a JSON object")
+    row = prepare(record.get("name"), record.get("message"))
+    if row is None:
+        return None
+    created_at = record.get("created_at")
+    if created_at not in (None, ""):
+        row["created_at"] = int(created_at)
+    elif record.get("timestamp"):
+        row["created_at"] = parse_legacy(record["timestamp"]) or row["created_at"]
+    return row
+
+def import_records(store, records, prepare, batch=1000, checkpoint=None, log=print):
+    """Validate, escape and insert `records`; returns (inserted, rejected).
+
+    `prepare(name, message)` is the submission validator (submission.prepare_message). A
+    record keeps its `created_at`, or the instant parsed from a legacy `timestamp`.
+    With `checkpoint`, the number of records handled is saved after every batch and
+    records up to it are skipped on the next run. A completed import removes it: it is a
+    line offset, only valid for the file as it was when the import stopped.
+    """
+    skip = read_checkpoint(checkpoint) if checkpoint else 0
+    inserted = rejected = 0
+    rows = []
+    position = 0
+    for position, record in enumerate(records, 1):
+        if position <= skip:
+            continue
+        try:
+            row = _record_row(record, prepare)
+        except (AttributeError, TypeError, ValueError) as e: # Not an object, or a malformed field
+            log(f"Record {position} rejected: {e}")
+            row = None
+        if row is None:
+            rejected += 1
+            continue
+        rows.append(row)
+        if len(rows) >= batch:
+            inserted += len(store.insert(rows))
+            rows = []
+            if checkpoint:
+                write_checkpoint(checkpoint, position)
+            log(f"Imported {inserted} rows ({position} records read)")
+    if rows:
+        inserted += len(store.insert(rows))
+    if checkpoint:
+        clear_checkpoint(checkpoint) # An edited or appended file is read from the start next time
+    log(f"Done: {inserted} rows imported, {rejected} rejected" + (f", {skip} skipped from the checkpoint" if skip else ""))
+    return inserted, rejected
@@ -0,0 +1,90 @@
+"""
+Maintenance commands, run against the backend configured in the environment (.env).
+
+    python cli.py backfill [--batch 500] [--after ID]   # created_at for rows that only have a timestamp string
+    python cli.py since 2025-01-01 [--limit 20]         # messages since a date, via the created_at index
+    python cli.py export [guestbook.ndjson]             # every message as NDJSON (stdout without a file)
+    python cli.py import guestbook.ndjson|.csv [--batch 1000]  # resumes from guestbook.ndjson.checkpoint
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from bulk import import_records, iter_export, read_records
+from storage import create_store, iter_rows
+from submission import prepare_message # Same validation and escaping as the submit form
+from timestamps import display_time, get_zone, parse_legacy
+
+def make_store():
+    load_dotenv()
+    return create_store(os.getenv("GUESTBOOK_BACKEND", "supabase"), supabase_url=os.getenv("SUPABASE_URL"),
+                        supabase_key=os.getenv("SUPABASE_KEY"), sqlite_path=os.getenv("GUESTBOOK_SQLITE_PATH", "guestbook.db"))
+
+def backfill(store, batch=500, after=0, log=print):
+    """Give every legacy row a `created_at` parsed from its `timestamp` string.
+
+    Walks the table by id one batch at a time and writes each batch in one call. Rows
+    that already have `created_at` are skipped, so it is safe to re-run; after a crash
+    resume from the last id it logged with `after`.
+    """
+    done = skipped = 0
+    pending = []
+    last_id = after
+    for row in iter_rows(store, chunk_size=batch, after=after):
+        last_id = row["id"]
+        if row.get("created_at") is not None:
+            continue
+        created_at = parse_legacy(row.get("timestamp"))
+        if created_at is None:
+            skipped += 1
+            continue
+        pending.append({**row, "created_at": created_at})
+        if len(pending) >= batch:
+            store.set_created_at(pending)
+            done += len(pending)
+            pending = []
+            log(f"Backfilled {done} rows (resume with --after {last_id})")
+    if pending:
+        store.set_created_at(pending)
+        done += len(pending)
+    log(f"Done: {done} rows backfilled, {skipped} with an unreadable timestamp left as they are")
+    return done, skipped
+
+def since(store, date, limit=20, tz=None):
+    tz = tz or os.getenv("GUESTBOOK_TIMEZONE", "Asia/Kolkata")
+    start = get_zone(tz).localize(datetime.strptime(date, "%Y-%m-%d"))
+    for row in store.fetch_since(int(start.timestamp()), limit):
+        print(f"{row['id']:>8}  {display_time(row, tz)}  {row['name']}: {row['message']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("backfill", help="Set created_at on rows written before it existed")
+    p.add_argument("--batch", type=int, default=500)
+    p.add_argument("--after", type=int, default=0, help="Resume after this id")
+    p = commands.add_parser("since", help="List messages since a date (YYYY-MM-DD, in GUESTBOOK_TIMEZONE)")
+    p.add_argument("date")
+    p.add_argument("--limit", type=int, default=20)
+    p = commands.add_parser("export", help="Write every message as NDJSON")
+    p.add_argument("path", nargs="?", help="Output file (default: stdout)")
+    p.add_argument("--chunk", type=int, default=1000)
+    p = commands.add_parser("import", help="Insert messages from an NDJSON or CSV file")
+    p.add_argument("path")
+    p.add_argument("--batch", type=int, default=1000)
+    p.add_argument("--checkpoint", help="Progress file (default: <path>.checkpoint)")
+    args = parser.parse_args()
+    if args.command == "backfill":
+        backfill(make_store(), batch=args.batch, after=args.after)
+    elif args.command == "since":
+        since(make_store(), args.date, limit=args.limit)
+    elif args.command == "export":
+        out = open(args.path, "w", encoding="utf-8") if args.path else sys.stdout
+        with out:
+            for chunk in iter_export(make_store(), chunk_size=args.chunk):
+                out.write(chunk)
+    elif args.command == "import":
+        import_records(make_store(), read_records(args.path), prepare_message, batch=args.batch,
+                       checkpoint=args.checkpoint or args.path + ".checkpoint")
@@ -0,0 +1,154 @@
+import hashlib
+import html
+import itertools
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+WORD_RE = re.compile(r"\w+")
+
+def normalize(text):
+    """Case-folded words separated by single spaces, so spacing and punctuation tweaks don't count.
+    Text with no words at all (emoji, punctuation) is kept whole, stripped and case-folded.
+    Stored text is HTML-escaped, so it is unescaped first: `&lt;3` is not the word "lt"."""
+    text = html.unescape(text).casefold()
+    return " ".join(WORD_RE.findall(text)) or text.strip()
+
+def fingerprint(name, message):
+    return hashlib.blake2b(f"{normalize(name)}\0{normalize(message)}".encode(), digest_size=16).digest()
+
+def simhash(text):
+    "64-bit simhash over word pairs; near-identical texts differ in only a few bits."
+    words = normalize(text).split()
+    shingles = [" ".join(words[i:i + 2]) for i in range(max(len(words) - 1, 1))]
+    hashes = [f"{int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big'):064b}" for s in shingles]
+    half = len(hashes) / 2
+    bits = "".join("1" if column.count("1") > half else "0" for column in zip(*hashes))
+    return int(bits, 2)
+
+class BloomFilter:
+    "Fixed-size Bloom filter over 16-byte fingerprints, sized for `capacity` items at `error_rate`."
+    def __init__(self, capacity, error_rate=1e-5):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fp):
+        h1, h2 = int.from_bytes(fp[:8], "little"), int.from_bytes(fp[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, fp):
+        for p in self._positions(fp):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, fp):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(fp))
+
+class DuplicateFilter:
+    """Drops repeated submissions seen within the last `window` seconds.
+
+    Recent fingerprints of the normalized `(name, message)` sit in an exact LRU of
+    `exact_size` entries. Entries pushed out of it while still inside the window move
+    into a Bloom filter, which remembers up to `capacity` more per window in a fixed
+    amount of memory; two Bloom generations rotate every `window` seconds. With
+    `near_distance` > 0, messages of `near_min_words` or more words whose simhash is
+    within that many bits of a recent one are dropped too, whoever posts them.
+
+    `claim` checks and records a submission in one step, so a double click racing on
+    two threads is caught; `release` forgets a claim whose insert failed.
+    """
+    NEAR_SCAN = 32 # Recent messages compared per simhash band
+
+    def __init__(self, window=600.0, exact_size=10000, capacity=100000, error_rate=1e-5,
+                 near_distance=0, near_min_words=6):
+        self.window = window
+        self.exact_size = exact_size
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.near_distance = near_distance
+        self.near_min_words = near_min_words
+        self._bands = near_distance + 1 # Within k bits means at least one of k+1 bands matches exactly
+        self._band_bits = 64 // self._bands
+        self._recent = OrderedDict() # fingerprint -> (claimed_at, simhash or None)
+        self._near = {}              # (band, value) -> fingerprints, oldest first
+        self._blooms = [BloomFilter(capacity, error_rate), BloomFilter(capacity, error_rate)]
+        self._rotated_at = None
+        self._lock = threading.Lock()
+        self.checked = self.duplicates = self.near_duplicates = 0
+
+    def _band_keys(self, sig):
+        mask = (1 << self._band_bits) - 1
+        return [(b, (sig >> (b * self._band_bits)) & mask) for b in range(self._bands)]
+
+    def _forget(self, fp, to_bloom):
+        _, sig = self._recent.pop(fp)
+        if sig is not None:
+            for key in self._band_keys(sig):
+                fps = self._near[key]
+                fps.pop(fp, None)
+                if not fps:
+                    del self._near[key]
+        if to_bloom:
+            self._blooms[0].add(fp)
+
+    def _expire(self, now):
+        if self._rotated_at is None:
+            self._rotated_at = now
+        if now - self._rotated_at >= self.window:
+            previous = self._blooms[0] if now - self._rotated_at < 2 * self.window else BloomFilter(self.capacity, self.error_rate)
+            self._blooms = [BloomFilter(self.capacity, self.error_rate), previous]
+            self._rotated_at = now
+        while self._recent:
+            fp, (claimed_at, _) = next(iter(self._recent.items()))
+            if now - claimed_at >= self.window:
+                self._forget(fp, to_bloom=False)
+            elif len(self._recent) > self.exact_size:
+                self._forget(fp, to_bloom=True) # Still in the window, the Bloom filter keeps it
+            else:
+                return
+
+    def _near_match(self, sig):
+        for key in self._band_keys(sig):
+            # Newest first and capped, so templated text sharing a band stays cheap to check
+            for fp in itertools.islice(reversed(self._near.get(key, {})), self.NEAR_SCAN):
+                if bin(self._recent[fp][1] ^ sig).count("1") <= self.near_distance:
+                    return True
+        return False
+
+    def claim(self, name, message, now=None):
+        "Record a submission; returns its fingerprint, or None when it duplicates a recent one."
+        now = time.monotonic() if now is None else now
+        fp = fingerprint(name, message)
+        sig = None
+        if self.near_distance and len(normalize(message).split()) >= self.near_min_words:
+            sig = simhash(message)
+        with self._lock:
+            self.checked += 1
+            self._expire(now)
+            if fp in self._recent or any(fp in bloom for bloom in self._blooms):
+                self.duplicates += 1
+                return None
+            if sig is not None and self._near_match(sig):
+                self.near_duplicates += 1
+                return None
+            self._recent[fp] = (now, sig)
+            if sig is not None:
+                for key in self._band_keys(sig):
+                    self._near.setdefault(key, {})[fp] = None
+            self._expire(now)
+            return fp
+
+    def release(self, fp):
+        "Forget a claimed submission (its insert failed), so a retry is accepted."
+        with self._lock:
+            if fp in self._recent:
+                self._forget(fp, to_bloom=False)
+
+    def stats(self):
+        return {'recent': len(self._recent), 'exact_size': self.exact_size, 'bloom_items': sum(b.count for b in self._blooms),
+                'bloom_bytes': sum(len(b.bits) for b in self._blooms), 'checked': self.checked,
+                'duplicates': self.duplicates, 'near_duplicates': self.near_duplicates}
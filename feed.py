@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+class FeedHub:
+    """Fan-out hub for the live message feed.
+
+    Every connected client gets its own bounded queue, grouped by a `key` (e.g. the
+    client's time zone). `publish` formats the SSE event once per key and hands the same
+    string to every queue under it; a client whose queue is full is dropped instead of
+    slowing everybody else down. `publish` may be called from any thread, delivery always
+    happens on the event loop that subscribed the clients.
+    """
+    def __init__(self, buffer_size=32):
+        self.buffer_size = buffer_size
+        self._clients = {} # key -> set of queues
+        self._lock = threading.Lock() # publish reads the keys from other threads
+        self._loop = None
+        self.published = self.dropped = 0
+
+    def subscribe(self, key=None):
+        self._loop = asyncio.get_running_loop()
+        q = asyncio.Queue(maxsize=self.buffer_size)
+        with self._lock:
+            self._clients.setdefault(key, set()).add(q)
+        return q
+
+    def unsubscribe(self, q, key=None):
+        with self._lock:
+            clients = self._clients.get(key)
+            if clients is not None:
+                clients.discard(q)
+                if not clients:
+                    del self._clients[key]
+
+    def publish(self, data, event="message"):
+        "`data` is the event text, or a callable returning it for a subscriber key."
+        if self._loop is None or not self._clients:
+            return
+        with self._lock:
+            keys = list(self._clients)
+        payloads = {}
+        for key in keys: # Rendered outside the lock
+            text = data(key) if callable(data) else data
+            lines = "".join(f"data: {line}\n" for line in text.split("\n"))
+            payloads[key] = f"event: {event}\n{lines}\n"
+        try:
+            self._loop.call_soon_threadsafe(self._fanout, payloads)
+        except RuntimeError: # Loop already closed
+            pass
+
+    def _fanout(self, payloads):
+        self.published += 1
+        for key, payload in payloads.items():
+            with self._lock:
+                clients = list(self._clients.get(key, ()))
+            for q in clients:
+                try:
+                    q.put_nowait(payload)
+                except asyncio.QueueFull:
+                    # Too slow: empty its buffer and leave only the sentinel that ends the stream
+                    self.unsubscribe(q, key)
+                    self.dropped += 1
+                    while not q.empty():
+                        q.get_nowait()
+                    q.put_nowait(None)
+
+    def client_count(self):
+        with self._lock:
+            return sum(len(clients) for clients in self._clients.values())
+
+    async def events(self, keepalive=15.0, key=None):
+        "Subscribe a client under `key` and yield its SSE chunks until it disconnects or is dropped."
+        q = self.subscribe(key)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(q.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n" # Comment line keeps proxies from closing idle streams
+                    continue
+                if payload is None:
+                    break
+                yield payload
+        finally:
+            self.unsubscribe(q, key)
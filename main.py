@@ -1,77 +1,451 @@
 import os
+import re
+import math
+import time
+import asyncio
+import contextvars
+import hashlib
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
-import pytz
+from email.utils import formatdate, parsedate_to_datetime
 import html # Added import
-from supabase import create_client
 from dotenv import load_dotenv
 from fasthtml.common import *
+from fastcore import xml # Its Html adds the doctype, as fasthtml's own page wrapper does
+from starlette.responses import StreamingResponse
+from api import FIELDS, encode_messages, encode_rows, parse_fields, parse_ids
+from assets import load_assets
+from bulk import export_line
+from cache import PageCache
+from dedup import DuplicateFilter, fingerprint
+from feed import FeedHub
+from metrics import Metrics, MetricsMiddleware, TimedStore, phase
+from moderation import ModerationQueue, Moderator
+from ratelimit import RateLimiter, RateLimitMiddleware
+from resilience import CircuitBreaker, ResilientStore
+from search import SearchIndex
+from sharedcache import SharedCache
+from singleflight import SingleFlight
+from stats import GuestbookStats
+from storage import LazyStore, create_store
+from submission import MAX_MESSAGE_CHAR, MAX_NAME_CHAR, prepare_message
+from timestamps import day_of, display_time, get_zone, valid_zone
+from writebehind import WriteBehindQueue
 
 # --- Setup ---
 load_dotenv()
-MAX_NAME_CHAR = 30
-MAX_MESSAGE_CHAR = 500
 MESSAGES_PER_PAGE = 10 # Added for pagination
-TIMESTAMP_FMT = "%Y-%m-%d %I:%M:%S %p %Z"
-IST_TZ = pytz.timezone("Asia/Kolkata")
+# Messages store UTC instants and are shown in the visitor's zone (their `tz` cookie), else this one
+DISPLAY_TZ = os.getenv("GUESTBOOK_TIMEZONE", "Asia/Kolkata")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+GUESTBOOK_BACKEND = os.getenv("GUESTBOOK_BACKEND", "supabase") # "supabase" or "sqlite"
+SQLITE_PATH = os.getenv("GUESTBOOK_SQLITE_PATH", "guestbook.db")
+BACKEND_TIMEOUT = float(os.getenv("GUESTBOOK_BACKEND_TIMEOUT", "5")) # Seconds per backend request
+# The backend client is created on first use (see LazyStore), not while the app is imported
+store = LazyStore(partial(create_store, GUESTBOOK_BACKEND, supabase_url=SUPABASE_URL, supabase_key=SUPABASE_KEY,
+                          sqlite_path=SQLITE_PATH, timeout=BACKEND_TIMEOUT))
+# Request timing and backend error counts, exposed at /metrics (see metrics.py)
+METRICS = os.getenv("GUESTBOOK_METRICS", "1") == "1"
+METRICS_TOKEN = os.getenv("GUESTBOOK_METRICS_TOKEN") # When set, /metrics needs `Authorization: Bearer <token>`
+metrics = Metrics()
+if METRICS:
+    store = TimedStore(store, metrics) # Inside the retries, so every attempt is timed
+# Reads are retried with jittered backoff; after repeated failures the circuit opens and
+# pages are served from their last good snapshot without calling the backend at all
+BACKEND_ATTEMPTS = int(os.getenv("GUESTBOOK_BACKEND_ATTEMPTS", "3"))
+BREAKER_FAILURES = int(os.getenv("GUESTBOOK_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("GUESTBOOK_BREAKER_RESET", "30"))
+resilient_store = store = ResilientStore(store, CircuitBreaker(failures=BREAKER_FAILURES, reset_after=BREAKER_RESET),
+                                         attempts=BACKEND_ATTEMPTS)
+STALE_PAGES = int(os.getenv("GUESTBOOK_STALE_PAGES", "32")) # Last good copies kept per page key
+stale_pages = PageCache(maxsize=STALE_PAGES, ttl=float("inf"))
+# The backend clients are synchronous, so every backend call from an async route runs
+# on this bounded pool instead of blocking the event loop.
+DB_WORKERS = int(os.getenv("GUESTBOOK_DB_WORKERS", "8"))
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="guestbook-db")
+# Pages of messages keyed by (page/cursor, per_page); cleared whenever an insert succeeds
+PAGE_CACHE_SIZE = int(os.getenv("GUESTBOOK_PAGE_CACHE_SIZE", "128"))
+PAGE_CACHE_TTL = float(os.getenv("GUESTBOOK_PAGE_CACHE_TTL", "30"))
+page_cache = PageCache(maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL)
+# Several workers on one host: pages of messages also go into a cache file they all share,
+# and an insert in any worker expires every worker's cached pages (see sharedcache.py)
+SHARED_CACHE_PATH = os.getenv("GUESTBOOK_SHARED_CACHE") # e.g. /tmp/guestbook-cache.db; unset keeps caches per process
+SHARED_CACHE_SIZE = int(os.getenv("GUESTBOOK_SHARED_CACHE_SIZE", "1024"))
+shared_cache = SharedCache(SHARED_CACHE_PATH, ttl=PAGE_CACHE_TTL, maxsize=SHARED_CACHE_SIZE) if SHARED_CACHE_PATH else None
+# Single flight: concurrent requests for the same page state (same ETag) share one
+# fetch-and-render, and the finished response is reused for GUESTBOOK_COALESCE_TTL seconds
+COALESCE = os.getenv("GUESTBOOK_COALESCE", "1") == "1"
+COALESCE_TTL = float(os.getenv("GUESTBOOK_COALESCE_TTL", "1"))
+page_flights = SingleFlight(ttl=COALESCE_TTL, cacheable=lambda response: "ETag" in response[1]) # Never stale fallbacks
+# Messages never change once inserted, so each one's rendered HTML is cached by (id, time zone)
+FRAGMENT_CACHE_SIZE = int(os.getenv("GUESTBOOK_FRAGMENT_CACHE_SIZE", "10000"))
+fragment_cache = PageCache(maxsize=FRAGMENT_CACHE_SIZE, ttl=float("inf"))
+# Message cards are written as strings rather than built as FT trees (same markup,
+# see render_message_fast); 0 goes back to the FT components
+FAST_RENDER = os.getenv("GUESTBOOK_FAST_RENDER", "1") == "1"
+# Live feed: new message cards are pushed to every open /messages/stream connection
+SSE_BUFFER = int(os.getenv("GUESTBOOK_SSE_BUFFER", "32")) # Events a slow client may fall behind before it is dropped
+SSE_KEEPALIVE = float(os.getenv("GUESTBOOK_SSE_KEEPALIVE", "15"))
+feed_hub = FeedHub(buffer_size=SSE_BUFFER)
+# Optional write-behind mode: submissions are queued and inserted in batches
+WRITE_BEHIND = os.getenv("GUESTBOOK_WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_BATCH = int(os.getenv("GUESTBOOK_WRITE_BEHIND_BATCH", "50"))
+WRITE_BEHIND_DELAY = float(os.getenv("GUESTBOOK_WRITE_BEHIND_DELAY", "0.5"))
+WRITE_BEHIND_CAPACITY = int(os.getenv("GUESTBOOK_WRITE_BEHIND_CAPACITY", "1000"))
+WRITE_BEHIND_BLOCK = float(os.getenv("GUESTBOOK_WRITE_BEHIND_BLOCK", "0")) # Seconds to wait when full, 0 rejects
+WRITE_BEHIND_ATTEMPTS = int(os.getenv("GUESTBOOK_WRITE_BEHIND_ATTEMPTS", "5")) # Tries per batch before giving up
+WRITE_BEHIND_FAILED_LOG = os.getenv("GUESTBOOK_WRITE_BEHIND_FAILED_LOG", "write-behind-failed.ndjson") # Importable with cli.py
+write_behind = None
+# Bulk export at /export.ndjson, streamed one keyset chunk at a time
+EXPORT_CHUNK = int(os.getenv("GUESTBOOK_EXPORT_CHUNK", "1000"))
+EXPORT_TOKEN = os.getenv("GUESTBOOK_EXPORT_TOKEN") # Enables /export.ndjson, which needs `Authorization: Bearer <token>`
+# JSON API at /api/v1/messages (see api.py)
+API_MAX_LIMIT = int(os.getenv("GUESTBOOK_API_MAX_LIMIT", "100")) # Most messages per page, and ids per lookup
+# Flood control for /submit-message: a token bucket per client IP
+RATE_LIMIT = float(os.getenv("GUESTBOOK_RATE_LIMIT", "6")) # Messages per minute per client, 0 disables
+RATE_BURST = int(os.getenv("GUESTBOOK_RATE_BURST", "3"))
+RATE_LIMIT_KEYS = int(os.getenv("GUESTBOOK_RATE_LIMIT_KEYS", "10000")) # Clients tracked at once
+TRUST_PROXY = os.getenv("GUESTBOOK_TRUST_PROXY", "0") == "1" # Take the client IP from X-Forwarded-For
+rate_limiter = RateLimiter(RATE_LIMIT / 60, RATE_BURST, max_keys=RATE_LIMIT_KEYS) if RATE_LIMIT > 0 else None
+# Duplicate suppression: repeats of a recent (name, message) are dropped before the insert
+DEDUP_WINDOW = float(os.getenv("GUESTBOOK_DEDUP_WINDOW", "600")) # Seconds, 0 disables
+DEDUP_EXACT = int(os.getenv("GUESTBOOK_DEDUP_EXACT", "10000"))
+DEDUP_CAPACITY = int(os.getenv("GUESTBOOK_DEDUP_CAPACITY", "100000")) # Older fingerprints per window, in a Bloom filter
+DEDUP_NEAR = int(os.getenv("GUESTBOOK_DEDUP_NEAR", "0")) # Simhash bits two messages may differ in, 0 disables
+duplicate_filter = DuplicateFilter(
+    window=DEDUP_WINDOW, exact_size=DEDUP_EXACT, capacity=DEDUP_CAPACITY, near_distance=DEDUP_NEAR
+) if DEDUP_WINDOW > 0 else None
+# Moderation: submissions matching the blocklist are held for review instead of published
+BLOCKLIST = os.getenv("GUESTBOOK_BLOCKLIST") # One pattern per line (see moderation.py); unset disables moderation
+BLOCKLIST_RELOAD = float(os.getenv("GUESTBOOK_BLOCKLIST_RELOAD", "5")) # Seconds between checks for a changed file
+MODERATION_LOG = os.getenv("GUESTBOOK_MODERATION_LOG", "moderation.ndjson") # Held messages, importable with cli.py
+MODERATION_QUEUE = int(os.getenv("GUESTBOOK_MODERATION_QUEUE", "1000"))
+moderator = Moderator(BLOCKLIST, reload_interval=BLOCKLIST_RELOAD).start() if BLOCKLIST else None
+moderation_queue = ModerationQueue(MODERATION_LOG, capacity=MODERATION_QUEUE).start() if BLOCKLIST else None
+# Fingerprinted, precompressed static assets (see assets.py); rebuilt here only when assets/ changed
+ASSET_BUILD_DIR, ASSET_MANIFEST = load_assets()
+ASSET_MAX_AGE = 31536000 # One year, URLs change whenever the content does
+# Live counters for the stats section, kept up to date by insert_messages
+STATS_RECONCILE_INTERVAL = float(os.getenv("GUESTBOOK_STATS_RECONCILE", "600")) # Seconds between full recounts
+# Conditional GET: validators come from the newest message id plus a hash of this file and the assets
+BUILD_ID = os.getenv("GUESTBOOK_BUILD_ID") or hashlib.sha1(
+    open(__file__, "rb").read() + repr(ASSET_MANIFEST).encode()
+).hexdigest()[:12]
+LATEST_ID_TTL = float(os.getenv("GUESTBOOK_LATEST_ID_TTL", "5")) # How often the newest id is re-read from the backend
 
 # --- Utility ---
-def get_ist_time():
-    return datetime.now(IST_TZ)
+def message_day(entry):
+    return day_of(entry, DISPLAY_TZ)
+
+def visitor_tz(request):
+    tz = request.cookies.get("tz")
+    return tz if valid_zone(tz) else DISPLAY_TZ
+
+def day_start():
+    "Epoch at which today began in the guestbook's zone."
+    return int(datetime.now(get_zone(DISPLAY_TZ)).replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+# Loaded by a counting query on the first page view (the page shows "…" until then)
+guestbook_stats = GuestbookStats(
+    store, today=lambda: datetime.now(get_zone(DISPLAY_TZ)).strftime("%Y-%m-%d"), day_of=message_day,
+    day_start=day_start, reconcile_interval=STATS_RECONCILE_INTERVAL
+)
+
+# Full-text search: built from a streamed scan on the first search, then kept current by insert_messages
+SEARCH_RESULTS = int(os.getenv("GUESTBOOK_SEARCH_RESULTS", "20"))
+search_index = SearchIndex()
+
+def invalidate_pages(latest_id=0, broadcast=True):
+    "Forget cached pages here and, with `broadcast`, in every worker sharing the cache."
+    page_cache.invalidate()
+    page_flights.invalidate()
+    if broadcast and shared_cache is not None:
+        shared_cache.invalidate(latest_id)
+
+def sync_invalidations():
+    "Apply invalidations other workers broadcast since the last call (a single-row read)."
+    if shared_cache is None:
+        return
+    latest_id = shared_cache.poll()
+    if latest_id is None:
+        return
+    invalidate_pages(broadcast=False)
+    guestbook_stats.mark_due() # Another worker inserted, recount
+    if latest_id:
+        note_latest_id(latest_id, force=False) # ETags move on without a backend round trip
+    else:
+        with _latest_lock:
+            _latest['checked'] = 0.0 # Nothing announced, re-read the newest id
+
+def insert_messages(rows):
+    "Write `rows` to the backend in one insert; raises only if the insert failed."
+    inserted = store.insert(rows)
+    if inserted:
+        after_insert(inserted)
+    return inserted
+
+def publish_messages(inserted):
+    for entry in sorted(inserted, key=lambda e: e['id']):
+        render_message_html(entry) # Warms the fragment cache while we have the row
+        feed_hub.publish(partial(render_message_html, entry)) # Live clients get it in their own zone
+
+def after_insert(inserted):
+    """Bring caches, counters and live clients up to date with committed rows. Each step's
+    failure is logged and the rest still run: the rows are stored, so the submission succeeded."""
+    latest_id = max(entry['id'] for entry in inserted)
+    for step in (partial(invalidate_pages, latest_id), partial(note_latest_id, latest_id, force=False),
+                 partial(guestbook_stats.add, inserted), partial(search_index.add, inserted),
+                 partial(publish_messages, inserted)):
+        try:
+            step()
+        except Exception as e:
+            print(f"Error after inserting {len(inserted)} messages ({step.func.__name__}): {e}")
 
 def add_message(name, message):
-    # Validate input
-    if not name or not name.strip():
-        print("Error: Name cannot be empty or just whitespace.")
-        return False
-    if not message or not message.strip():
-        print("Error: Message cannot be empty or just whitespace.")
-        return False
-    if len(name.strip()) > MAX_NAME_CHAR:
-        print(f"Error: Name exceeds maximum length of {MAX_NAME_CHAR}.")
-        return False
-    if len(message.strip()) > MAX_MESSAGE_CHAR:
-        print(f"Error: Message exceeds maximum length of {MAX_MESSAGE_CHAR}.")
-        return False
-
-    # Sanitize input
-    sanitized_name = html.escape(name.strip())
-    sanitized_message = html.escape(message.strip())
-
-    timestamp = get_ist_time().strftime(TIMESTAMP_FMT)
+    return post_message(name, message)[0] in ("published", "queued")
+
+def post_message(name, message):
+    """Validate, filter and store a submission. Returns (outcome, row): "invalid", "duplicate",
+    "held" (for moderation), "queued" (write-behind), "published" (row as inserted) or "failed"."""
+    row = prepare_message(name, message)
+    if row is None:
+        return "invalid", None
+    claim = None
+    if duplicate_filter is not None:
+        claim = duplicate_filter.claim(row['name'], row['message'])
+        if claim is None:
+            print("Error: Duplicate message, dropped.")
+            return "duplicate", None
+    if moderator is not None:
+        matches = moderator.scan(html.unescape(row['name']), html.unescape(row['message']))
+        if matches: # Kept out of the guestbook; the moderation worker records it for review
+            if not moderation_queue.submit(row, matches):
+                print("Error: Moderation queue is full, message dropped.")
+            return "held", row
+    if write_behind is not None:
+        # Queued rows are flushed in batches by the write-behind thread
+        if not write_behind.submit(row):
+            print("Error: Write-behind queue is full, message rejected.")
+            release_claim(claim)
+            return "failed", None
+        mark_modified() # Page one shows queued rows, so it changed already
+        return "queued", row
     try:
-        supabase.table("myGuestbook").insert(
-            {"name": sanitized_name, "message": sanitized_message, "timestamp": timestamp}
-        ).execute()
-        return True
+        return "published", insert_messages([row])[0]
     except Exception as e:
-        print(f"Error adding message to Supabase: {e}")
-        return False
+        print(f"Error adding message to {GUESTBOOK_BACKEND}: {e}")
+        release_claim(claim) # Let the visitor retry
+        return "failed", None
+
+def release_claim(claim):
+    if claim is not None and duplicate_filter is not None:
+        duplicate_filter.release(claim)
+
+def _fetch_messages(page: int, per_page: int, before: int = None):
+    # Keyset pagination: with a `before` cursor we fetch `id < before`, otherwise we
+    # fall back to offset paging so old `?page=N` links keep working.
+    # Either way we ask for one extra row instead of an exact count; if it comes back
+    # there is another page, and the backend never has to count the whole table.
+    offset = (page - 1) * per_page
+    rows = store.fetch(per_page + 1, before=before, offset=offset)
 
-def get_messages(page: int = 1, per_page: int = MESSAGES_PER_PAGE):
+    has_more = len(rows) > per_page
+    data = rows[:per_page]
+    total_fetched = len(data)
+    next_cursor = data[-1]['id'] if has_more else None
+
+    return {'data': data, 'current_page': page, 'per_page': per_page, 'total_fetched': total_fetched, 'has_more': has_more, 'next_cursor': next_cursor}
+
+def _page_cache_key(page, per_page, before):
+    return ('before', before, per_page) if before is not None else ('page', page, per_page)
+
+def _load_messages(page, per_page, before):
+    key = _page_cache_key(page, per_page, before)
+    local_generation = page_cache.generation # Before the fetch, so an insert racing it wins
+    if shared_cache is not None:
+        generation = shared_cache.generation()
+        messages_info = shared_cache.get(repr(key))
+        if messages_info is not None:
+            page_cache.set(key, messages_info, local_generation)
+            return messages_info
     try:
-        offset = (page - 1) * per_page
-        response = (
-            supabase.table("myGuestbook")
-            .select("*", count="exact") # Request total count
-            .order("id", desc=True)
-            .range(offset, offset + per_page - 1) # Use range for pagination
-            .execute()
-        )
-        # The count is available in response.count if `count="exact"` is used.
-        # For has_more, we check if fetched items + offset < total count,
-        # or simpler: if fetched items == per_page (common proxy for has_more).
-        total_fetched = len(response.data)
-        # has_more = (offset + total_fetched) < response.count if response.count is not None else False
-        # Simpler has_more for now:
-        has_more = total_fetched == per_page
-
-        return {'data': response.data, 'current_page': page, 'per_page': per_page, 'total_fetched': total_fetched, 'has_more': has_more}
+        messages_info = _fetch_messages(page, per_page, before)
     except Exception as e:
         print(f"Error getting messages: {e}")
-        return {'data': [], 'current_page': page, 'per_page': per_page, 'total_fetched': 0, 'has_more': False}
+        snapshot = stale_pages.get(key) # Marked stale, and never put in the page cache
+        if snapshot is not None:
+            return {**snapshot, 'stale': True}
+        return {'data': [], 'current_page': page, 'per_page': per_page, 'total_fetched': 0, 'has_more': False, 'next_cursor': None, 'stale': True}
+    page_cache.set(key, messages_info, local_generation)
+    stale_pages.set(key, messages_info)
+    if shared_cache is not None:
+        shared_cache.set(repr(key), messages_info, generation)
+    return messages_info
+
+def get_messages(page: int = 1, per_page: int = MESSAGES_PER_PAGE, before: int = None):
+    sync_invalidations()
+    cached = page_cache.get(_page_cache_key(page, per_page, before))
+    if cached is not None:
+        return cached
+    return _load_messages(page, per_page, before)
+
+def save_unwritten(rows):
+    "Queued rows that could not be inserted: let their senders post again, and keep them for `cli.py import`."
+    for row in rows:
+        release_claim(fingerprint(row['name'], row['message']))
+    try:
+        with open(WRITE_BEHIND_FAILED_LOG, "a", encoding="utf-8") as f:
+            f.writelines(export_line(row) for row in rows)
+        print(f"Error: gave up inserting {len(rows)} queued messages, saved to {WRITE_BEHIND_FAILED_LOG}")
+    except OSError as e:
+        print(f"Error saving {len(rows)} unwritten messages to {WRITE_BEHIND_FAILED_LOG}: {e}")
+        for row in rows:
+            print(f"Unwritten message: {export_line(row)}", end="")
+
+if WRITE_BEHIND:
+    write_behind = WriteBehindQueue(
+        insert_messages, max_batch=WRITE_BEHIND_BATCH, max_delay=WRITE_BEHIND_DELAY,
+        capacity=WRITE_BEHIND_CAPACITY, block_timeout=WRITE_BEHIND_BLOCK,
+        attempts=WRITE_BEHIND_ATTEMPTS, give_up=save_unwritten
+    ).start()
+
+def flush_write_behind():
+    if write_behind is not None:
+        write_behind.close()
+    if moderation_queue is not None:
+        moderation_queue.close()
+
+# --- Conditional GET ---
+_latest = {'id': None, 'modified': time.time(), 'checked': 0.0}
+_latest_lock = threading.Lock()
+
+def note_latest_id(message_id, force=True):
+    "Record the newest message id; `force=False` only moves it forward (our own inserts)."
+    with _latest_lock:
+        changed = message_id != _latest['id'] and (force or _latest['id'] is None or message_id > _latest['id'])
+        if changed:
+            external = _latest['id'] is not None and force
+            _latest.update(id=message_id, modified=time.time())
+        _latest['checked'] = time.monotonic()
+    if changed and external:
+        invalidate_pages(message_id) # Written elsewhere (another worker, the dashboard), cached pages are stale
+        guestbook_stats.mark_due()
+
+def mark_modified():
+    with _latest_lock:
+        _latest['modified'] = time.time()
+
+def refresh_latest_id():
+    try:
+        note_latest_id(store.max_id())
+    except Exception as e:
+        print(f"Error getting latest message id: {e}")
+        with _latest_lock:
+            _latest['checked'] = time.monotonic() # Don't hammer a failing backend
+    return _latest['id'], _latest['modified']
+
+def page_validators(request, latest_id, modified, variant=None, stats=False):
+    """`variant` names a representation that doesn't depend on request headers, like the JSON API's.
+    The ETag is built from state every worker agrees on, so any of them can answer a revalidation;
+    `stats` is for pages that show the stats section."""
+    vary = variant is None
+    if vary:
+        variant = "hx" if "hx-request" in request.headers else "page" # Same URL, fragment or full page
+        variant += "-" + visitor_tz(request) # Times are rendered in the visitor's zone
+        if write_behind is not None and write_behind.depth():
+            variant += f"-q{write_behind.accepted}" # Rows queued here are shown on top of page one
+    if stats: # Counted from the backend, so workers agree once each has recounted
+        snapshot = guestbook_stats.snapshot()
+        variant += f"-{snapshot['messages']}.{snapshot['authors']}.{snapshot['today']}" if snapshot['loaded'] else "-loading"
+    validators = {
+        "ETag": f'W/"{BUILD_ID}-{latest_id}-{variant}"',
+        "Last-Modified": formatdate(modified, usegmt=True),
+        "Cache-Control": "no-cache", # Always revalidate, a 304 costs next to nothing
+    }
+    if vary:
+        validators["Vary"] = "HX-Request, Cookie"
+    return validators
+
+def is_not_modified(request, validators):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = validators["ETag"].removeprefix("W/")
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(_latest['modified']) <= since
+    return False
+
+def current_latest_id():
+    "Apply other workers' invalidations, re-read the newest id when due, and return (id, modified)."
+    sync_invalidations() # A message inserted by another worker changes the ETag straight away
+    if time.monotonic() - _latest['checked'] > LATEST_ID_TTL:
+        return refresh_latest_id()
+    return _latest['id'], _latest['modified']
+
+async def check_not_modified(request, variant=None, stats=False):
+    "Validators for the current page state, and a 304 response if the client's copy is still fresh."
+    if shared_cache is not None or time.monotonic() - _latest['checked'] > LATEST_ID_TTL:
+        latest_id, modified = await run_db(current_latest_id) # Both read a database
+    else:
+        latest_id, modified = _latest['id'], _latest['modified']
+    validators = page_validators(request, latest_id, modified, variant, stats)
+    if is_not_modified(request, validators):
+        return validators, Response(status_code=304, headers=validators)
+    return validators, None
+
+def response_headers(validators, messages_info):
+    "A stale fallback page is never stored, so it can't be revalidated as the fresh one later."
+    if messages_info.get('stale'):
+        return {"Cache-Control": "no-store", **{k: v for k, v in validators.items() if k == "Vary"}}
+    return validators
+
+# --- Rate limiting ---
+def client_ip(request):
+    if TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.rsplit(",", 1)[-1].strip() # The address our proxy saw
+    return request.client.host if request.client else "unknown"
+
+def check_rate_limit(request):
+    "A 429 response when this client is over its submission rate, else None."
+    if rate_limiter is None:
+        return None
+    retry_after = rate_limiter.check(client_ip(request))
+    if not retry_after:
+        return None
+    return Response("Too many messages, please wait a moment before posting again.", status_code=429,
+                    headers={"Retry-After": str(math.ceil(retry_after))})
+
+# --- Async data access ---
+async def run_db(fn, *args, **kwargs):
+    "Run a blocking backend call on `db_executor` and await its result."
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context() # So backend time is counted against the request that waits for it
+    return await loop.run_in_executor(db_executor, partial(ctx.run, fn, *args, **kwargs))
+
+async def add_message_async(name, message):
+    return await run_db(add_message, name, message)
+
+async def get_messages_async(page: int = 1, per_page: int = MESSAGES_PER_PAGE, before: int = None):
+    # Cache hits are served on the event loop without a hop to the executor, unless the
+    # shared cache's invalidation bus has to be read first
+    if shared_cache is not None:
+        return await run_db(get_messages, page, per_page, before)
+    cached = page_cache.get(_page_cache_key(page, per_page, before))
+    if cached is not None:
+        return cached
+    return await run_db(_load_messages, page, per_page, before)
 
 def render_avatar(name):
     initials = "".join([x[0] for x in name.split()][:2]).upper()
@@ -80,14 +454,14 @@ def render_avatar(name):
         _class="avatar-circle"
     )
 
-def render_message(entry):
+def render_message(entry, tz=DISPLAY_TZ):
     return Div(
         Div(
             render_avatar(entry['name']),
             Div(
                 Span(entry['name'], _class="message-author"),
                 Span("·", _class="meta-separator"),  # <-- Add this separator
-                Span(entry['timestamp'], _class="message-time"),
+                Span(display_time(entry, tz), _class="message-time"),
                 _class="message-meta"
             ),
             _class="message-header-flex"
@@ -96,6 +470,52 @@ def render_message(entry):
         _class="message-card"
     )
 
+def render_message_fast(entry, tz=DISPLAY_TZ):
+    "`to_xml(render_message(entry, tz))`, written straight into one string instead of built as nine FT nodes."
+    name = entry['name']
+    initials = "".join([x[0] for x in name.split()][:2]).upper()
+    return ('<div class="message-card">\n'
+            '  <div class="message-header-flex">\n'
+            '    <div class="avatar-circle">\n'
+            f'      <span class="avatar-initials">{html.escape(initials)}</span>\n'
+            '    </div>\n'
+            '    <div class="message-meta">\n'
+            f'      <span class="message-author">{html.escape(name)}</span>\n'
+            '      <span class="meta-separator">·</span>\n'
+            f'      <span class="message-time">{html.escape(display_time(entry, tz))}</span>\n'
+            '    </div>\n'
+            '  </div>\n'
+            f'  <p class="message-content">{html.escape(entry["message"])}</p>\n'
+            '</div>\n')
+
+def _render_card_html(entry, tz):
+    if FAST_RENDER:
+        with phase("serialize"):
+            return render_message_fast(entry, tz).rstrip('\n')
+    card = render_message(entry, tz)
+    with phase("serialize"):
+        # to_xml adds a trailing newline, and so does the serializer around NotStr children
+        return to_xml(card).rstrip('\n')
+
+def render_message_html(entry, tz=DISPLAY_TZ):
+    "The HTML for `render_message(entry, tz)`, served from `fragment_cache` once rendered."
+    if entry.get('id') is None: # Still queued for write-behind, no stable key yet
+        return _render_card_html(entry, tz)
+    fragment = fragment_cache.get((entry['id'], tz))
+    if fragment is None:
+        fragment = _render_card_html(entry, tz)
+        fragment_cache.set((entry['id'], tz), fragment)
+    return fragment
+
+def render_messages_by_ids(ids, tz=DISPLAY_TZ):
+    "Message cards for `ids` in that order; only rows without a cached fragment are fetched."
+    fragments = {i: fragment_cache.get((i, tz)) for i in ids}
+    missing = [i for i, fragment in fragments.items() if fragment is None]
+    if missing:
+        for entry in store.get_by_ids(missing):
+            fragments[entry['id']] = render_message_html(entry, tz)
+    return [NotStr(fragments[i]) for i in ids if fragments[i] is not None]
+
 def render_message_list():
     messages = get_messages()
     if not messages:
@@ -121,10 +541,31 @@ def render_message_list():
     #         ),
     #         id="message-list" # This ID will now be on the wrapper in index()
     #     )
-def render_message_list_content(page: int):
-    messages_info = get_messages(page=page, per_page=MESSAGES_PER_PAGE)
+def render_unavailable(before=None):
+    "Shown when the backend fails and there is no saved copy of the page."
+    if before is not None: # Load More: offer the same page again
+        return [Button("Couldn't load messages, try again", _class="load-more-button",
+                       hx_get=f"/messages?before={before}", hx_target="this", hx_swap="outerHTML")]
+    return [Div(
+        I(_class="fas fa-plug-circle-exclamation empty-icon"),
+        H3("Messages are unavailable", _class="empty-title"),
+        P("The guestbook can't reach its database right now. Please try again in a moment.", _class="empty-text"),
+        _class="empty-message"
+    )]
+
+def render_message_list_content(page: int = 1, before: int = None, messages_info=None, tz=DISPLAY_TZ):
+    # Async routes fetch with get_messages_async and pass the result in
+    if messages_info is None:
+        messages_info = get_messages(page=page, per_page=MESSAGES_PER_PAGE, before=before)
     
-    if page == 1 and messages_info['total_fetched'] == 0:
+    # Messages still waiting in the write-behind queue go on top of the first page,
+    # so a visitor sees their own submission straight away
+    pending = write_behind.pending() if write_behind is not None and page == 1 and before is None else []
+
+    if messages_info.get('stale') and messages_info['total_fetched'] == 0 and not pending:
+        return render_unavailable(before)
+
+    if page == 1 and before is None and messages_info['total_fetched'] == 0 and not pending:
         return [Div( # Return as a list with one item
             Div(
                 I(_class="far fa-comment-dots empty-icon"),
@@ -135,20 +576,23 @@ def render_message_list_content(page: int):
             # id="message-list-items" # ID will be on the wrapper
         )]
 
-    rendered_messages = [render_message(entry) for entry in messages_info['data']]
+    rendered_messages = [NotStr(render_message_html(entry, tz)) for entry in pending + messages_info['data']]
+    if messages_info.get('stale'):
+        rendered_messages.insert(0, P("Showing saved messages while the guestbook reconnects.", _class="stale-notice"))
 
     if messages_info['has_more']:
-        rendered_messages.append(
-            Button("Load More Messages", 
-                   _class="load-more-button", 
-                   hx_get=f"/messages?page={page + 1}", 
-                   hx_target="this", # The button itself
-                   hx_swap="outerHTML", # Replace button with new content (new msgs + next button)
-                   # Consider adding hx_indicator here if a global one isn't used
-                  )
-        )
+        rendered_messages.append(render_load_more(messages_info['next_cursor']))
     return rendered_messages
 
+def render_load_more(cursor):
+    return Button("Load More Messages", 
+                  _class="load-more-button", 
+                  hx_get=f"/messages?before={cursor}", # Cursor of the oldest message shown
+                  hx_target="this", # The button itself
+                  hx_swap="outerHTML", # Replace button with new content (new msgs + next button)
+                  # Consider adding hx_indicator here if a global one isn't used
+                 )
+
 def render_theme_toggle():
     toggle_script = Script("""
     document.addEventListener('DOMContentLoaded', function() {
@@ -180,20 +624,152 @@ def render_theme_toggle():
         _class="theme-toggle-container"
     )
 
+# --- Static assets ---
+def has_asset(name):
+    return ASSET_MANIFEST is not None and name in ASSET_MANIFEST['assets']
+
+def asset_url(name, fallback=None):
+    "Fingerprinted URL for a file under assets/, or the plain /assets/ URL when no build is available."
+    if has_asset(name):
+        return f"/assets/build/{ASSET_MANIFEST['assets'][name]['file']}"
+    return f"/assets/{fallback or name}"
+
+def asset_links():
+    links = [Link(rel='icon', type='image/x-icon', href=asset_url("favicon.ico", fallback="me.ico"))]
+    if has_asset("favicon-32.png"):
+        links.append(Link(rel='icon', type='image/png', sizes='32x32', href=asset_url("favicon-32.png")))
+    if has_asset("apple-touch-icon.png"):
+        links.append(Link(rel='apple-touch-icon', href=asset_url("apple-touch-icon.png")))
+    links.append(Link(rel='stylesheet', href=asset_url("style.css")))
+    return links
+
+def _accepted_encodings(accept_encoding):
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+_built_assets = {info['file']: info for info in (ASSET_MANIFEST or {}).get('assets', {}).values()}
+
+async def serve_built_asset(request):
+    fname = request.path_params['fname']
+    info = _built_assets.get(fname) # Only names from the manifest, never arbitrary paths
+    if info is None:
+        return Response(status_code=404)
+    headers = {"Cache-Control": f"public, max-age={ASSET_MAX_AGE}, immutable", "Vary": "Accept-Encoding"}
+    path = os.path.join(ASSET_BUILD_DIR, fname)
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in info['encodings'] and encoding in accepted:
+            headers["Content-Encoding"] = encoding
+            path += suffix
+            break
+    return FileResponse(path, media_type=mimetypes.guess_type(fname)[0], headers=headers)
+
 # --- Main Content ---
 app, rt = fast_app(
+    on_shutdown=[flush_write_behind],
     hdrs=(
-        Link(rel='icon', type='image/x-icon', href="/assets/me.ico"),
-        Link(rel='stylesheet', href='/assets/style.css'),
+        *asset_links(),
         Link(rel='preconnect', href="https://fonts.googleapis.com"),
         Link(rel='preconnect', href="https://fonts.gstatic.com", crossorigin=""),
         Link(rel='stylesheet', href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap"),
         Link(rel='stylesheet', href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.2.1/css/all.min.css"),
+        Script(src="https://unpkg.com/htmx-ext-sse@2.2.2/sse.js"),
+        # Lets the server render message times in the visitor's own time zone from the next request on
+        Script("document.cookie='tz='+Intl.DateTimeFormat().resolvedOptions().timeZone+';path=/;max-age=31536000;samesite=lax'"),
     )
 )
+# Ahead of fast_app's catch-all static route, which would serve these without cache headers
+if ASSET_BUILD_DIR is not None:
+    app.routes.insert(0, Route("/assets/build/{fname}", serve_built_asset))
 
-@app.get("/")
-def index():
+# --- Metrics ---
+HEAD_TAGS = ('title', 'meta', 'link', 'style', 'base')
+
+def serialize_ft(request, content):
+    """FT `content` as fasthtml sends it: as it is for HTMX requests, otherwise wrapped in
+    a page with the app's headers (byte-identical, see test_page_shell_is_byte_identical_to_ft_page)."""
+    content = flat_tuple(content)
+    if "hx-request" not in request.headers and not any(getattr(o, 'tag', '') == 'html' for o in content):
+        titles = [o for o in content if getattr(o, 'tag', '') in HEAD_TAGS] or [Title('FastHTML page')]
+        body = tuple(o for o in content if getattr(o, 'tag', '') not in HEAD_TAGS)
+        # fasthtml puts the app's headers, footers and page attributes on every request it routes
+        content = xml.Html(Head(*titles, *flat_xt(request.hdrs)), Body(body, *flat_xt(request.ftrs), **request.bodykw), **request.htmlkw)
+    return to_xml(content, lvl=int(fh_cfg.indent)) # fasthtml passes its indent flag as the level, so pages start one space in
+
+def ft_response(request, content, headers=None):
+    "An HTML response for FT `content`, serialized here so the time counts as the serialize phase."
+    with phase("serialize"):
+        return HTMLResponse(serialize_ft(request, content), headers=headers)
+
+def app_metrics():
+    "Cache, feed and write-path counters, read when /metrics is scraped."
+    page, fragments = page_cache.stats(), fragment_cache.stats()
+    out = {
+        "guestbook_page_cache_hits_total": ("counter", "Page cache hits.", page['hits']),
+        "guestbook_page_cache_misses_total": ("counter", "Page cache misses.", page['misses']),
+        "guestbook_fragment_cache_hits_total": ("counter", "Rendered message card cache hits.", fragments['hits']),
+        "guestbook_fragment_cache_misses_total": ("counter", "Rendered message card cache misses.", fragments['misses']),
+        "guestbook_feed_clients": ("gauge", "Open live feed connections.", feed_hub.client_count()),
+        "guestbook_search_documents": ("gauge", "Messages in the search index.", search_index.doc_count),
+    }
+    breaker = resilient_store.breaker
+    out["guestbook_backend_circuit_open"] = ("gauge", "1 while the backend circuit breaker is open.", int(breaker.state != "closed"))
+    out["guestbook_backend_circuit_refused_total"] = ("counter", "Backend calls skipped because the circuit was open.", breaker.refused)
+    out["guestbook_backend_retries_total"] = ("counter", "Backend reads retried after a failure.", resilient_store.retries)
+    out["guestbook_stale_pages_served_total"] = ("counter", "Pages served from their last good snapshot.", stale_pages.stats()['hits'])
+    flights = page_flights.stats()
+    out["guestbook_coalesced_requests_total"] = ("counter", "Page requests that shared another request's fetch and render.", flights['coalesced'])
+    out["guestbook_coalesce_reused_total"] = ("counter", "Page requests answered from a response finished within the coalescing TTL.", flights['reused'])
+    if shared_cache is not None:
+        shared = shared_cache.stats()
+        out["guestbook_shared_cache_hits_total"] = ("counter", "Pages of messages read from the cache shared by all workers.", shared['hits'])
+        out["guestbook_shared_cache_misses_total"] = ("counter", "Shared cache lookups that went to the backend.", shared['misses'])
+    if moderator is not None:
+        out["guestbook_blocklist_patterns"] = ("gauge", "Patterns in the loaded blocklist.", len(moderator.blocklist))
+        out["guestbook_moderation_held_total"] = ("counter", "Submissions held for moderation.", moderation_queue.held)
+        out["guestbook_moderation_queue_depth"] = ("gauge", "Held submissions not yet written for review.", moderation_queue.depth())
+    if rate_limiter is not None:
+        out["guestbook_rate_limited_total"] = ("counter", "Submissions rejected by the rate limiter.", rate_limiter.rejected)
+    if duplicate_filter is not None:
+        dupes = duplicate_filter.duplicates + duplicate_filter.near_duplicates
+        out["guestbook_duplicates_total"] = ("counter", "Submissions dropped as duplicates.", dupes)
+    if write_behind is not None:
+        queue = write_behind.stats()
+        out["guestbook_write_behind_depth"] = ("gauge", "Submissions waiting to be inserted.", queue['depth'])
+        out["guestbook_write_behind_rejected_total"] = ("counter", "Submissions rejected by a full queue.", queue['rejected'])
+    return out
+
+# Over-limit posts are answered before routing; added first so the metrics still time them
+app.add_middleware(RateLimitMiddleware, check=check_rate_limit, paths=("/submit-message", "/api/v1/messages"))
+
+if METRICS:
+    app.add_middleware(MetricsMiddleware, metrics=metrics, routes=app.routes)
+    metrics.add_collector(app_metrics)
+
+def render_message_list_items(messages_info, tz=DISPLAY_TZ):
+    return Div(*render_message_list_content(page=1, messages_info=messages_info, tz=tz), id="message-list-items", # Unpack content here
+               hx_ext="sse", sse_connect="/messages/stream", sse_swap="message", hx_swap="afterbegin") # New messages arrive live
+
+def render_stats_section(stats):
+    def stat(n): return f"{n:,}" if stats['loaded'] else "…"
+    return Section(
+        Div(
+            Div(I(_class="fas fa-users stat-icon"), Div(H3(stat(stats['authors']), _class="stat-number"), P("Visitors", _class="stat-label"), _class="stat-text"), _class="stat-item glass-card"),
+            Div(I(_class="fas fa-comments stat-icon"), Div(H3(stat(stats['messages']), _class="stat-number"), P("Messages", _class="stat-label"), _class="stat-text"), _class="stat-item glass-card"),
+            Div(I(_class="fas fa-calendar-day stat-icon"), Div(H3(stat(stats['today']), _class="stat-number"), P("Today", _class="stat-label"), _class="stat-text"), _class="stat-item glass-card"),
+            Div(I(_class="fas fa-heart stat-icon"), Div(H3("Thank You", _class="stat-number"), P("For Visiting", _class="stat-label"), _class="stat-text"), _class="stat-item glass-card"),
+            _class="stats-container"
+        ),
+        _class="stats-section"
+    )
+
+def render_page(message_list, stats_section):
+    "Everything on `/` around the message list and stats; none of it depends on the request."
     form = Form(
         Div(
             # Consider adding <Label for="name-input">Your Name</Label> explicitly for better a11y
@@ -233,7 +809,7 @@ def index():
         hx_post="/submit-message",
         hx_target="#message-list",
         hx_swap="outerHTML",
-        hx_on__after_request="this.reset();document.getElementById('char-counter').textContent='{MAX_MESSAGE_CHAR} characters remaining';",
+        hx_on__after_request="if(event.detail.successful){this.reset();document.getElementById('char-counter').textContent='{MAX_MESSAGE_CHAR} characters remaining';}", # Keep the text when rate limited
         _class="guestbook-form glass-card"
     )
 
@@ -253,25 +829,17 @@ def index():
     messages_section = Section(
         Div(
             H2("Recent Messages", _class="section-title"),
+            Input(type="search", name="q", placeholder="Search messages...", _class="search-input", aria_label="Search messages",
+                  hx_get="/search", hx_trigger="input changed delay:300ms, search", hx_target="#message-list-items", hx_swap="innerHTML"),
             I(_class="fas fa-sync-alt refresh-icon", title="Refresh messages",
               hx_get="/messages?page=1", hx_target="#message-list-items", hx_swap="innerHTML", # Or outerHTML if #message-list-items is the direct list
               role="button", aria_label="Refresh messages", tabindex="0"),
             _class="section-header"
         ),
-        Div(*render_message_list_content(page=1), id="message-list-items"), # Unpack content here
+        message_list,
         _class="messages-section"
     )
 
-    stats_section = Section(
-        Div(
-            Div(I(_class="fas fa-users stat-icon"), Div(H3("25+", _class="stat-number"), P("Visitors", _class="stat-label"), _class="stat-text"), _class="stat-item glass-card"),
-            Div(I(_class="fas fa-comments stat-icon"), Div(H3("100+", _class="stat-number"), P("Messages", _class="stat-label"), _class="stat-text"), _class="stat-item glass-card"),
-            Div(I(_class="fas fa-heart stat-icon"), Div(H3("Thank You", _class="stat-number"), P("For Visiting", _class="stat-label"), _class="stat-text"), _class="stat-item glass-card"),
-            _class="stats-container"
-        ),
-        _class="stats-section"
-    )
-
     footer = Footer(
         Div(
             P("Made with ", Span("❤️", _class="heart"), " by ", A("Sujal", href="https://github.com/sujalkalra", target="_blank", _class="footer-link")),
@@ -295,9 +863,66 @@ def index():
         footer
     ]
 
+# --- Page shell ---
+# The invariant page is serialized once per variant (full page / htmx) with a marker
+# where each dynamic part goes, and kept as bytes. A request then only serializes the
+# dynamic parts, at the indent level the marker had, so the result is byte-identical
+# to serializing the whole FT tree.
+PAGE_SHELL = os.getenv("GUESTBOOK_PAGE_SHELL", "1") == "1"
+SHELL_SLOT_RE = re.compile(r'^( *)<div id="guestbook-slot-(\w+)"></div>\n', re.M)
+_page_shells = {}
+
+def shell_slot(name):
+    return Div(id=f"guestbook-slot-{name}")
+
+def build_page_shell(request):
+    "Split the serialized page into byte chunks and `(slot name, indent level)` pairs."
+    text = serialize_ft(request, render_page(shell_slot("messages"), shell_slot("stats")))
+    parts, pos = [], 0
+    for m in SHELL_SLOT_RE.finditer(text):
+        parts.append(text[pos:m.start()].encode())
+        parts.append((m.group(2), len(m.group(1))))
+        pos = m.end()
+    parts.append(text[pos:].encode())
+    return parts
+
+def render_from_shell(request, **slots):
+    variant = "hx" if "hx-request" in request.headers else "page"
+    shell = _page_shells.get(variant)
+    if shell is None:
+        shell = _page_shells[variant] = build_page_shell(request)
+    with phase("serialize"):
+        return b"".join(part if isinstance(part, bytes) else to_xml(slots[part[0]], lvl=part[1]).encode()
+                        for part in shell)
+
+async def coalesced(key, render, media_type="text/html"):
+    "Respond with `render()`'s (body, headers), shared with concurrent requests for the same `key`."
+    body, headers = await page_flights.run(key, render) if COALESCE else await render()
+    return Response(body, media_type=media_type, headers=headers)
+
+@app.get("/")
+async def index(request):
+    validators, not_modified = await check_not_modified(request, stats=True)
+    if not_modified:
+        return not_modified
+    guestbook_stats.maybe_reconcile(db_executor)
+    if not PAGE_SHELL:
+        messages_info = await get_messages_async(page=1)
+        message_list = render_message_list_items(messages_info, visitor_tz(request))
+        stats_section = render_stats_section(guestbook_stats.snapshot())
+        return ft_response(request, render_page(message_list, stats_section), response_headers(validators, messages_info))
+    return await coalesced(("/", validators["ETag"]), partial(render_index, request, validators))
+
+async def render_index(request, validators):
+    "The page from its shell, as (body, headers)."
+    messages_info = await get_messages_async(page=1)
+    message_list = render_message_list_items(messages_info, visitor_tz(request))
+    stats_section = render_stats_section(guestbook_stats.snapshot())
+    return render_from_shell(request, messages=message_list, stats=stats_section), response_headers(validators, messages_info)
+
 @app.post("/submit-message")
-async def submit_message(name: str, message: str):
-    add_message(name, message) # Return value is ignored as per current plan
+async def submit_message(request, name: str, message: str):
+    await add_message_async(name, message) # Return value is ignored as per current plan
     # The old render_message_list() is gone.
     # This should probably return the new structure as well, if used by any hx-post.
     # For now, let's assume the form's hx_target="#message-list-items" and hx_swap will handle it
@@ -308,13 +933,143 @@ async def submit_message(name: str, message: str):
     # The form's hx_target should be "#message-list-items" and hx_swap="innerHTML" (or outerHTML).
     # Let's update the form target and swap in the index() function later if needed.
     # For now, this function will return the first page of messages.
-    return render_message_list_content(page=1)
+    messages_info = await get_messages_async(page=1)
+    return ft_response(request, render_message_list_content(page=1, messages_info=messages_info, tz=visitor_tz(request)))
 
 
 # This replaces the old @app.get("/refresh-messages")
 @app.get("/messages")
-async def get_messages_paginated(page: int = 1): # FastAPI/Starlette handles query param conversion
-    return render_message_list_content(page=page)
+async def get_messages_paginated(request, page: int = 1, before: int = None): # FastAPI/Starlette handles query param conversion
+    # `before` is the keyset cursor used by the "Load More" button; `page` is kept for old links
+    page = max(page, 1) # A negative OFFSET is a backend error, not an empty page
+    validators, not_modified = await check_not_modified(request)
+    if not_modified:
+        return not_modified
+    return await coalesced(("/messages", page, before, validators["ETag"]),
+                           partial(render_messages_page, request, validators, page, before))
+
+async def render_messages_page(request, validators, page, before):
+    "A page of messages as (body, headers), serialized the way fasthtml would."
+    messages_info = await get_messages_async(page=page, before=before)
+    content = render_message_list_content(page=page, before=before, messages_info=messages_info, tz=visitor_tz(request))
+    with phase("serialize"):
+        return serialize_ft(request, content).encode(), response_headers(validators, messages_info)
+
+@app.get("/search")
+async def search_messages(request, q: str = ""):
+    tz = visitor_tz(request)
+    if not q.strip(): # Cleared search box: back to the latest messages
+        messages_info = await get_messages_async(page=1)
+        return ft_response(request, render_message_list_content(page=1, messages_info=messages_info, tz=tz))
+    if not search_index.ready:
+        await run_db(search_index.ensure_loaded, store) # Only the first search pays for the scan
+    ids = search_index.search(q, limit=SEARCH_RESULTS)
+    try:
+        results = await run_db(render_messages_by_ids, ids, tz) if ids else []
+    except Exception as e:
+        print(f"Error getting search results: {e}")
+        results = []
+    if not results:
+        return ft_response(request, Div(
+            I(_class="fas fa-search empty-icon"),
+            H3("No matching messages", _class="empty-title"),
+            P("Try a different word or name.", _class="empty-text"),
+            _class="empty-message"
+        ))
+    return ft_response(request, results)
+
+@app.get("/export.ndjson")
+async def export_messages(request):
+    if not EXPORT_TOKEN: # Off unless a token is configured, it reads and hands out every row
+        return Response("Not Found", status_code=404)
+    if request.headers.get("authorization") != f"Bearer {EXPORT_TOKEN}":
+        return Response("Export requires a token.", status_code=401)
+    async def chunks():
+        after = 0
+        while True:
+            rows = await run_db(store.scan, after=after, limit=EXPORT_CHUNK)
+            if rows:
+                yield "".join(export_line(row) for row in rows)
+            if len(rows) < EXPORT_CHUNK:
+                return
+            after = rows[-1]['id']
+    return StreamingResponse(chunks(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": 'attachment; filename="guestbook.ndjson"'})
+
+# --- JSON API ---
+def api_error(message, status_code=400):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+@app.get("/api/v1/messages")
+async def api_messages(request, before: int = None, limit: int = MESSAGES_PER_PAGE, fields: str = "", ids: str = ""):
+    "Newest-first messages; `before` is the cursor from the previous page's `next_cursor`."
+    try:
+        fields = parse_fields(fields)
+        wanted = parse_ids(ids, API_MAX_LIMIT) if ids else None
+    except ValueError as e:
+        return api_error(str(e))
+    if not 1 <= limit <= API_MAX_LIMIT:
+        return api_error(f"limit must be between 1 and {API_MAX_LIMIT}")
+    validators, not_modified = await check_not_modified(request, variant="api")
+    if not_modified:
+        return not_modified
+    if wanted is not None:
+        try:
+            rows = await run_db(store.get_by_ids, wanted)
+        except Exception as e:
+            print(f"Error getting messages by id: {e}")
+            return api_error("Messages are unavailable", 503)
+        by_id = {row['id']: row for row in rows}
+        body = encode_messages([by_id[i] for i in wanted if i in by_id], fields) # In the order asked for
+        return Response(body, media_type="application/json", headers=validators)
+    return await coalesced(("/api/v1/messages", before, limit, fields, validators["ETag"]),
+                           partial(render_api_page, validators, before, limit, fields), "application/json")
+
+async def render_api_page(validators, before, limit, fields):
+    "A page of messages as JSON (body, headers), from the same page caches as the HTML routes."
+    messages_info = await get_messages_async(page=1, per_page=limit, before=before)
+    with phase("serialize"):
+        body = encode_messages(messages_info['data'], fields, messages_info['next_cursor'], messages_info.get('stale', False))
+    return body, response_headers(validators, messages_info)
+
+@app.post("/api/v1/messages")
+async def api_post_message(request):
+    'Submit `{"name": ..., "message": ...}`, checked like the form.'
+    try:
+        submission = await request.json()
+        name, message = submission["name"], submission["message"]
+    except (ValueError, TypeError, KeyError):
+        return api_error('Send a JSON object with "name" and "message"')
+    if not isinstance(name, str) or not isinstance(message, str):
+        return api_error('"name" and "message" must be strings')
+    outcome, row = await run_db(post_message, name, message)
+    if outcome == "published":
+        return Response(encode_rows([row], FIELDS), status_code=201, media_type="application/json")
+    if outcome in ("queued", "held"): # Held messages look queued, so the blocklist can't be probed
+        return JSONResponse({"status": "pending"}, status_code=202)
+    if outcome == "invalid":
+        return api_error(f"name (up to {MAX_NAME_CHAR} characters) and message (up to {MAX_MESSAGE_CHAR}) are required", 422)
+    if outcome == "duplicate":
+        return api_error("Duplicate message", 409)
+    return api_error("The message couldn't be saved, try again", 503)
+
+@app.get("/metrics")
+def metrics_endpoint(request):
+    if not METRICS:
+        return Response("Not Found", status_code=404)
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response("Metrics require a token.", status_code=401)
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/messages/stream")
+async def stream_messages(request):
+    # Server-Sent Events: each new message card is pushed once, no polling needed, with
+    # its time rendered in the visitor's zone like the rest of the list
+    return StreamingResponse(
+        feed_hub.events(keepalive=SSE_KEEPALIVE, key=visitor_tz(request)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 css_style = Style("""
 @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&family=Nunito:wght@400;700&display=swap');
@@ -780,3 +1535,4 @@ body {
     border-radius: var(--radius);
     border: 1px solid var(--border);
 }
+""")
@@ -0,0 +1,216 @@
+"""
+Request timing and a Prometheus `/metrics` exposition.
+
+`MetricsMiddleware` times every HTTP request per route template and keeps an in-flight
+gauge. During a request, time spent in the backend (`TimedStore`) and in HTML
+serialization (`phase("serialize")`, which the routes wrap around their own
+serialization) is added to per-request phase totals carried in a context variable;
+whatever else a matched route spent before its response started is counted as render
+time. The
+phase totals are mutable dicts, so work done on the db executor is counted as long as
+it runs in a copy of the request's context.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from storage import MessageStore
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ("backend", "render", "serialize")
+
+_current = contextvars.ContextVar("guestbook_request_phases", default=None)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _labels(pairs):
+    return ",".join(f'{k}="{v}"' for k, v in pairs)
+
+class Metrics:
+    "Thread-safe registry of the app's histograms, counters and gauges."
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}       # (route, method, status) -> Histogram of total seconds
+        self.phases = {}         # (route, phase) -> Histogram of seconds
+        self.backend = {}        # operation -> Histogram of seconds
+        self.backend_errors = {} # operation -> count
+        self.in_flight = 0
+        self._collectors = []
+
+    def _observe(self, table, key, value):
+        with self._lock:
+            hist = table.get(key)
+            if hist is None:
+                hist = table[key] = Histogram()
+            hist.observe(value)
+
+    def observe_request(self, route, method, status, seconds, phases):
+        self._observe(self.requests, (route, method, status), seconds)
+        if phases.get("render") is None:
+            return # No route matched (404), so there are no phases to report
+        for name in PHASES:
+            self._observe(self.phases, (route, name), phases[name])
+
+    def observe_backend(self, operation, seconds, error=False):
+        self._observe(self.backend, operation, seconds)
+        if error:
+            with self._lock:
+                self.backend_errors[operation] = self.backend_errors.get(operation, 0) + 1
+
+    def add_collector(self, fn):
+        "`fn()` returns `{name: (type, help, value)}` for extra gauges/counters read at scrape time."
+        self._collectors.append(fn)
+
+    def _histogram_lines(self, name, help, table, label_names):
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+        for key, hist in sorted(table.items()):
+            labels = list(zip(label_names, key if isinstance(key, tuple) else (key,)))
+            cumulative = 0
+            for bound, count in zip((*hist.buckets, "+Inf"), hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{_labels(labels + [("le", bound)])}}} {cumulative}')
+            lines.append(f"{name}_sum{{{_labels(labels)}}} {hist.sum:.6f}")
+            lines.append(f"{name}_count{{{_labels(labels)}}} {hist.count}")
+        return lines
+
+    def render(self):
+        "All metrics in the Prometheus text exposition format."
+        with self._lock:
+            lines = self._histogram_lines("guestbook_request_seconds", "Request latency by route.",
+                                          self.requests, ("route", "method", "status"))
+            lines += self._histogram_lines("guestbook_request_phase_seconds", "Time per request spent in the backend, rendering and serializing.",
+                                           self.phases, ("route", "phase"))
+            lines += self._histogram_lines("guestbook_backend_seconds", "Backend call latency by operation.",
+                                           self.backend, ("operation",))
+            lines += ["# HELP guestbook_backend_errors_total Failed backend calls by operation.",
+                      "# TYPE guestbook_backend_errors_total counter"]
+            lines += [f'guestbook_backend_errors_total{{operation="{op}"}} {n}' for op, n in sorted(self.backend_errors.items())]
+            lines += ["# HELP guestbook_requests_in_flight Requests being handled (live feed streams excluded).",
+                      "# TYPE guestbook_requests_in_flight gauge", f"guestbook_requests_in_flight {self.in_flight}"]
+        for collect in self._collectors:
+            for name, (kind, help, value) in collect().items():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+@contextmanager
+def phase(name):
+    "Add the time spent in the block to the current request's `name` phase."
+    phases = _current.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] += time.perf_counter() - start
+
+class TimedStore(MessageStore):
+    "Wraps a store so every call is timed, errors are counted and request backend time is tracked."
+    def __init__(self, store, metrics):
+        self.store = store
+        self.metrics = metrics
+
+    def is_backend_error(self, error):
+        return self.store.is_backend_error(error)
+
+    def _call(self, operation, *args, **kwargs):
+        start = time.perf_counter()
+        error = False
+        try:
+            return getattr(self.store, operation)(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe_backend(operation, elapsed, error)
+            phases = _current.get()
+            if phases is not None:
+                phases["backend"] += elapsed
+
+    def insert(self, rows):
+        return self._call("insert", rows)
+
+    def fetch(self, limit, before=None, offset=0):
+        return self._call("fetch", limit, before=before, offset=offset)
+
+    def max_id(self):
+        return self._call("max_id")
+
+    def scan(self, after=0, limit=1000, columns="*"):
+        return self._call("scan", after=after, limit=limit, columns=columns)
+
+    def get_by_ids(self, ids):
+        return self._call("get_by_ids", ids)
+
+    def counts(self, since):
+        return self._call("counts", since)
+
+    def fetch_since(self, since, limit):
+        return self._call("fetch_since", since, limit)
+
+    def set_created_at(self, rows):
+        return self._call("set_created_at", rows)
+
+class MetricsMiddleware:
+    "ASGI middleware recording latency per route template, status and phase."
+    def __init__(self, app, metrics, routes):
+        self.app = app
+        self.metrics = metrics
+        self.routes = routes
+        self._templates, self._paths, self._route_count = {}, set(), 0
+
+    def _route(self, scope):
+        if self._route_count != len(self.routes): # Routes are added after the middleware is
+            self._templates = {getattr(r, "endpoint", None): r.path for r in self.routes if hasattr(r, "path")}
+            self._paths = set(self._templates.values())
+            self._route_count = len(self.routes)
+        if "endpoint" not in scope and scope["path"] in self._paths:
+            return scope["path"] # Answered before routing (e.g. rate limited); a literal path is its own template
+        return self._templates.get(scope.get("endpoint"), "unmatched") # Templates keep label cardinality bounded
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        phases = {"start": time.perf_counter(), "backend": 0.0, "render": None, "serialize": 0.0}
+        token = _current.set(phases)
+        status, streaming = 500, False
+        with self.metrics._lock:
+            self.metrics.in_flight += 1
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if "endpoint" in scope: # The route handler is done; what it didn't spend elsewhere was rendering
+                    elapsed = time.perf_counter() - phases["start"]
+                    phases["render"] = max(0.0, elapsed - phases["backend"] - phases["serialize"])
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if content_type.startswith(b"text/event-stream"):
+                    streaming = True # A live feed connection lasts minutes, not part of request latency
+                    with self.metrics._lock:
+                        self.metrics.in_flight -= 1
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if not streaming:
+                with self.metrics._lock:
+                    self.metrics.in_flight -= 1
+                elapsed = time.perf_counter() - phases["start"]
+                self.metrics.observe_request(self._route(scope), scope["method"], status, elapsed, phases)
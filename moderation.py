@@ -0,0 +1,224 @@
+"""
+Blocklist moderation.
+
+The blocklist (one pattern per line, `#` comments) is compiled into an Aho-Corasick
+automaton, so a submission is checked against every pattern in one pass over its text
+however long the list is. Patterns match whole words or phrases, case-insensitively;
+a pattern starting with `*` also matches inside words. The file is re-read in the
+background when it changes. Submissions that match are not published: they go on a
+queue that a worker thread writes to a review file, in the NDJSON format `cli.py
+import` reads, so approved messages can be imported as they are.
+"""
+import html
+import json
+import os
+import queue
+import re
+import threading
+import unicodedata
+
+SPACES_RE = re.compile(r"\s+")
+
+def normalize(text):
+    "The form both patterns and submissions are matched in."
+    return SPACES_RE.sub(" ", unicodedata.normalize("NFKC", text).casefold())
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+class Blocklist:
+    "An Aho-Corasick automaton over `patterns`, (text, anywhere) pairs."
+    def __init__(self, patterns):
+        self.patterns = [] # (normalized text, anywhere)
+        goto, out = [{}], [[]]
+        seen = set()
+        for text, anywhere in patterns:
+            text = normalize(text).strip()
+            if not text or (text, anywhere) in seen:
+                continue
+            seen.add((text, anywhere))
+            state = 0
+            for ch in text:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = goto[state][ch] = len(goto)
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(len(self.patterns))
+            self.patterns.append((text, anywhere))
+        # Failure links, breadth first so a node's link target is always finished before it
+        fail = [0] * len(goto)
+        level = list(goto[0].values())
+        while level:
+            next_level = []
+            for node in level:
+                for ch, child in goto[node].items():
+                    f = fail[node]
+                    while f and ch not in goto[f]:
+                        f = fail[f]
+                    fail[child] = goto[f].get(ch, 0)
+                    out[child] += out[fail[child]] # Patterns that end here as a suffix
+                    next_level.append(child)
+            level = next_level
+        self._goto, self._fail = goto, fail
+        self._out = [tuple(o) for o in out]
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def scan(self, text):
+        "Patterns found in `text`, each once, in the order they first end."
+        text = normalize(text)
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        found = {}
+        state = 0
+        for end, ch in enumerate(text, 1):
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if not out[state]:
+                continue
+            for index in out[state]:
+                pattern, anywhere = patterns[index]
+                if not anywhere:
+                    start = end - len(pattern)
+                    if (start > 0 and _is_word_char(text[start - 1])) or (end < len(text) and _is_word_char(text[end])):
+                        continue
+                found.setdefault(pattern, None)
+        return list(found)
+
+def read_blocklist(path):
+    "(pattern, anywhere) pairs from a blocklist file."
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield (line[1:], True) if line.startswith("*") else (line, False)
+
+class Moderator:
+    """Scans submissions with the current blocklist and swaps in a new one when the file changes.
+
+    A background thread loads the file, then checks its modification time every
+    `reload_interval` seconds and compiles a changed list there; requests keep
+    scanning with the previous automaton until the new one is complete. A file that
+    can't be read leaves the current list in place.
+    """
+    def __init__(self, path, reload_interval=5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.blocklist = Blocklist(())
+        self.reloads = 0
+        self._mtime = None
+        self._loaded = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def reload(self):
+        "Recompile the blocklist if the file changed; returns whether it did."
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return False
+            blocklist = Blocklist(read_blocklist(self.path))
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error loading blocklist {self.path}: {e}")
+            self._loaded.set() # Don't keep submissions waiting for a file that isn't there
+            return False
+        self.blocklist, self._mtime = blocklist, mtime # One reference swap, scans never see a partial list
+        self.reloads += 1
+        self._loaded.set()
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="guestbook-blocklist", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        self.reload()
+        while not self._stop.wait(self.reload_interval):
+            self.reload()
+
+    def close(self):
+        self._stop.set()
+
+    def scan(self, *texts, timeout=5.0):
+        "Blocklist patterns found in any of `texts`; the first call waits for the list to load."
+        self._loaded.wait(timeout)
+        blocklist = self.blocklist
+        return list(dict.fromkeys(p for text in texts for p in blocklist.scan(text)))
+
+class ModerationQueue:
+    """Held submissions waiting for the moderation worker.
+
+    `submit` never blocks: beyond `capacity` waiting rows it returns False. The
+    worker thread appends each held row to `log_path` with the patterns it matched,
+    names and messages unescaped like an export.
+    """
+    def __init__(self, log_path, capacity=1000):
+        self.log_path = log_path
+        self._queue = queue.Queue(maxsize=capacity)
+        self._stop = threading.Event()
+        self._thread = None
+        self.held = self.written = self.dropped = 0
+
+    def submit(self, row, matches):
+        try:
+            self._queue.put_nowait((row, matches))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.held += 1
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="guestbook-moderation", daemon=True)
+            self._thread.start()
+        return self
+
+    def _write(self, items):
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                for row, matches in items:
+                    record = {"name": html.unescape(row["name"]), "message": html.unescape(row["message"]),
+                              "created_at": row.get("created_at"), "matches": matches}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.written += len(items)
+        except OSError as e:
+            print(f"Error writing {len(items)} held messages to {self.log_path}: {e}")
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self._write([first] + self._drain())
+
+    def close(self, timeout=10.0):
+        "Stop the worker and write out everything still queued."
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        items = self._drain()
+        if items:
+            self._write(items)
+
+    def stats(self):
+        return {'depth': self.depth(), 'held': self.held, 'written': self.written, 'dropped': self.dropped}
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+from starlette.requests import Request
+
+class RateLimiter:
+    """Per-client token buckets for flood control on the write path.
+
+    Each key (a client IP) may spend `burst` tokens at once and regains `rate` tokens
+    per second. Buckets live in an LRU ordered by last use, so a check is O(1), memory
+    is capped at `max_keys` buckets and idle ones are dropped from the cold end: a
+    bucket idle for `burst / rate` seconds is full again, same as a missing one.
+    """
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.idle_after = burst / rate if rate > 0 else float("inf")
+        self._buckets = OrderedDict() # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self.allowed = self.rejected = self.evictions = 0
+
+    def _expire(self, now):
+        while self._buckets:
+            key, (_, updated_at) = next(iter(self._buckets.items()))
+            if now - updated_at < self.idle_after and len(self._buckets) <= self.max_keys:
+                return
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+
+    def check(self, key, now=None):
+        "Take a token for `key`; returns 0 when allowed, otherwise the seconds until one is available."
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                self.allowed += 1
+                retry_after = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                self.rejected += 1
+                retry_after = (1 - tokens) / self.rate
+            self._expire(now)
+            return retry_after
+
+    def stats(self):
+        return {'keys': len(self._buckets), 'max_keys': self.max_keys, 'rate': self.rate, 'burst': self.burst,
+                'allowed': self.allowed, 'rejected': self.rejected, 'evictions': self.evictions}
+
+class RateLimitMiddleware:
+    """Answers over-limit posts to `paths` before routing. `check(request)` returns the
+    rejection response or None. A rejected post skips form parsing and the per-request
+    setup fasthtml does for every route (copying the app's headers), which cost more than
+    the rest of the rejection, so a flood of them takes less time from readers."""
+    def __init__(self, app, check, paths):
+        self.app = app
+        self.check = check
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            response = self.check(Request(scope))
+            if response is not None:
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+
+from storage import MessageStore
+
+class CircuitOpenError(Exception):
+    "Raised instead of calling a backend that has failed repeatedly and is being left alone."
+
+class CircuitBreaker:
+    """Stops calling a failing backend for a while.
+
+    After `failures` consecutive failed calls the circuit opens and `allow` refuses
+    every call for `reset_after` seconds. Then a single trial call is let through
+    (half-open): success closes the circuit, failure opens it for another period.
+    """
+    def __init__(self, failures=5, reset_after=30.0):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._failed = 0
+        self._opened_at = None
+        self._trial = False
+        self.opened = self.refused = 0
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self._opened_at >= self.reset_after else "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self._opened_at >= self.reset_after:
+                self._trial = True # Only one caller probes the backend
+                return True
+            self.refused += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            self._failed, self._opened_at, self._trial = 0, None, False
+
+    def failure(self):
+        with self._lock:
+            self._failed += 1
+            if self._trial or (self._opened_at is None and self._failed >= self.failures):
+                self._opened_at = time.monotonic()
+                self.opened += 1
+            self._trial = False
+
+def backoff(attempt, base=0.05, cap=1.0):
+    "Seconds to sleep before retry number `attempt` (1-based): exponential with full jitter."
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+class ResilientStore(MessageStore):
+    """Wraps a store with a circuit breaker and bounded retries.
+
+    Reads (and `set_created_at`, an idempotent upsert) are retried up to `attempts`
+    times with jittered backoff; `insert` is tried once, since a timed-out insert may
+    still have been written. While the breaker is open every call fails at once with
+    CircuitOpenError, so callers can fall back without waiting on the network. Only errors
+    the store's `is_backend_error` accepts are retried and counted as failures; anything
+    else is the caller's mistake and is raised at once.
+    """
+    def __init__(self, store, breaker=None, attempts=3, base_delay=0.05, max_delay=1.0):
+        self.store = store
+        self.breaker = breaker or CircuitBreaker()
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def _call(self, operation, *args, retry=True, **kwargs):
+        for attempt in range(1, (self.attempts if retry else 1) + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"backend unavailable, {operation} not attempted")
+            try:
+                result = getattr(self.store, operation)(*args, **kwargs)
+            except Exception as e:
+                if not self._is_backend_error(e):
+                    self.breaker.success() # The backend answered
+                    raise
+                self.breaker.failure()
+                if not retry or attempt == self.attempts:
+                    raise
+                self.retries += 1
+                time.sleep(backoff(attempt, self.base_delay, self.max_delay))
+            else:
+                self.breaker.success()
+                return result
+
+    def _is_backend_error(self, error):
+        check = getattr(self.store, "is_backend_error", None)
+        return check(error) if check is not None else isinstance(error, OSError)
+
+    def insert(self, rows):
+        return self._call("insert", rows, retry=False)
+
+    def fetch(self, limit, before=None, offset=0):
+        return self._call("fetch", limit, before=before, offset=offset)
+
+    def max_id(self):
+        return self._call("max_id")
+
+    def scan(self, after=0, limit=1000, columns="*"):
+        return self._call("scan", after=after, limit=limit, columns=columns)
+
+    def get_by_ids(self, ids):
+        return self._call("get_by_ids", ids)
+
+    def counts(self, since):
+        return self._call("counts", since)
+
+    def fetch_since(self, since, limit):
+        return self._call("fetch_since", since, limit)
+
+    def set_created_at(self, rows):
+        return self._call("set_created_at", rows)
@@ -0,0 +1,136 @@
+import bisect
+import heapq
+import html
+import math
+import re
+import sys
+import threading
+from array import array
+
+from storage import iter_rows
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text):
+    "Lower-cased word tokens; stored messages are HTML-escaped, so unescape first."
+    return TOKEN_RE.findall(html.unescape(text).casefold())
+
+class SearchIndex:
+    """In-memory inverted index over message `name` and `message`.
+
+    Each token maps to a posting list of message ids kept as a sorted `array('I')`
+    (4 bytes per entry). The sorted vocabulary allows prefix matches on the last
+    query word, so results can follow the visitor's typing. Results are ranked by an
+    idf-weighted count of matched words, newest first on ties.
+    """
+    def __init__(self):
+        self._postings = {}
+        self._vocab = [] # Sorted tokens, for prefix lookups
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+        self.doc_count = 0
+        self.max_id = 0
+        self.ready = False
+
+    def _add(self, doc_id, text, new_tokens):
+        tokens = set(tokenize(text))
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array('I')
+                new_tokens.append(token)
+            if not postings or postings[-1] < doc_id:
+                postings.append(doc_id) # The common case: ids only grow
+                continue
+            i = bisect.bisect_left(postings, doc_id)
+            if i < len(postings) and postings[i] == doc_id:
+                return # Already indexed (seen by both the startup scan and `add`)
+            postings.insert(i, doc_id)
+        self.doc_count += 1
+        self.max_id = max(self.max_id, doc_id)
+
+    def add(self, rows):
+        "Index freshly inserted rows."
+        with self._lock:
+            new_tokens = []
+            for row in rows:
+                self._add(row['id'], f"{row['name']} {row['message']}", new_tokens)
+            for token in new_tokens:
+                bisect.insort(self._vocab, token)
+
+    def _add_chunk(self, rows, new_tokens):
+        with self._lock:
+            for row in rows:
+                self._add(row['id'], f"{row['name']} {row['message']}", new_tokens)
+
+    def build(self, rows, chunk_size=5000):
+        """Index an iterable of rows (e.g. a streamed table scan).
+
+        The lock is taken per chunk so inserts are never held up for the whole build;
+        tokens first seen here join the sorted vocabulary once at the end.
+        """
+        new_tokens, chunk = [], []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                self._add_chunk(chunk, new_tokens)
+                chunk = []
+        self._add_chunk(chunk, new_tokens)
+        with self._lock:
+            self._vocab = sorted(set(self._vocab).union(new_tokens))
+            self.ready = True
+
+    def _prefix_postings(self, prefix, limit=50):
+        "Posting lists of up to `limit` vocabulary tokens starting with `prefix`."
+        i = bisect.bisect_left(self._vocab, prefix)
+        out = []
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix) and len(out) < limit:
+            out.append(self._postings[self._vocab[i]])
+            i += 1
+        return out
+
+    def search(self, query, limit=20, prefix=True):
+        "Ids of the best matches for `query`, best first."
+        terms = tokenize(query)
+        if not terms:
+            return []
+        last_is_prefix = prefix and not query[-1:].isspace()
+        scores = {}
+        with self._lock:
+            n = max(self.doc_count, 1)
+            for term in dict.fromkeys(terms):
+                if last_is_prefix and term == terms[-1]:
+                    lists = self._prefix_postings(term)
+                else:
+                    lists = [self._postings[term]] if term in self._postings else []
+                df = sum(len(p) for p in lists)
+                if not df:
+                    continue
+                weight = math.log(1 + n / df)
+                seen = set()
+                for postings in lists:
+                    for doc_id in postings:
+                        if doc_id not in seen: # A doc counts once per query word
+                            seen.add(doc_id)
+                            scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        return [doc_id for _, doc_id in heapq.nlargest(limit, ((score, doc_id) for doc_id, score in scores.items()))]
+
+    def load(self, store, chunk_size=5000):
+        "Build from a streamed scan of the backend, one keyset chunk at a time."
+        try:
+            self.build(iter_rows(store, columns="id,name,message", chunk_size=chunk_size), chunk_size=chunk_size)
+        except Exception as e:
+            print(f"Error building search index: {e}")
+
+    def ensure_loaded(self, store, chunk_size=5000):
+        "`load` unless that already succeeded; concurrent callers wait for the one build."
+        with self._loading:
+            if not self.ready:
+                self.load(store, chunk_size)
+
+    def memory_bytes(self):
+        "Approximate size of the posting lists and vocabulary."
+        with self._lock:
+            postings = sum(p.buffer_info()[1] * p.itemsize + 64 for p in self._postings.values())
+            vocab = sum(sys.getsizeof(t) for t in self._vocab)
+            return postings + vocab + sys.getsizeof(self._postings) + sys.getsizeof(self._vocab)
@@ -0,0 +1,77 @@
+import json
+import sqlite3
+import threading
+import time
+
+class SharedCache:
+    """Cache shared by every worker process on the host, kept in one local SQLite file.
+
+    Values are JSON. Each entry records the generation it was computed under and only
+    entries of the current generation are served, so `invalidate` is a single-row
+    update that makes every worker's copies unreachable at once. The same row is the
+    invalidation bus: `poll` tells a worker that another process bumped it, together
+    with the newest message id that process wrote.
+    """
+    def __init__(self, path, ttl=30.0, maxsize=1024):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self.hits = self.misses = self.sets = 0
+        db = self._db()
+        db.execute("CREATE TABLE IF NOT EXISTS bus (id INTEGER PRIMARY KEY CHECK (id = 0), generation INTEGER, latest_id INTEGER)")
+        db.execute("INSERT OR IGNORE INTO bus VALUES (0, 0, 0)")
+        db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, generation INTEGER, expires REAL, value TEXT) WITHOUT ROWID")
+        self._seen = self.generation()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL") # A lost cache write after a power cut costs nothing
+        return db
+
+    def generation(self):
+        return self._db().execute("SELECT generation FROM bus").fetchone()[0]
+
+    def get(self, key):
+        row = self._db().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires > ? AND generation = (SELECT generation FROM bus)",
+            (key, time.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, generation):
+        "Store `value` computed under `generation` (read before the backend call, so a racing invalidate wins)."
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, generation, time.time() + self.ttl, json.dumps(value)))
+        self.sets += 1
+        if self.sets % 64 == 0:
+            self.trim()
+
+    def trim(self):
+        "Drop old generations and expired entries, then the soonest to expire beyond `maxsize`."
+        db = self._db()
+        db.execute("DELETE FROM entries WHERE generation < (SELECT generation FROM bus) OR expires < ?", (time.time(),))
+        db.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires DESC LIMIT -1 OFFSET ?)", (self.maxsize,))
+
+    def invalidate(self, latest_id=0):
+        "Expire every worker's entries and announce `latest_id` (the newest message id) to them."
+        self._seen = self._db().execute(
+            "UPDATE bus SET generation = generation + 1, latest_id = max(latest_id, ?) RETURNING generation",
+            (latest_id,)).fetchone()[0]
+
+    def poll(self):
+        "The newest announced message id if another process invalidated since the last poll, else None."
+        generation, latest_id = self._db().execute("SELECT generation, latest_id FROM bus").fetchone()
+        if generation == self._seen:
+            return None
+        self._seen = generation
+        return latest_id
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'sets': self.sets}
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from collections import OrderedDict
+from functools import partial
+
+class SingleFlight:
+    """Coalesces concurrent identical work on the event loop.
+
+    `run(key, fn)` starts `fn()` as a task unless one is already in flight for `key`,
+    in which case the caller just awaits that task's result. The task is shielded, so
+    the request that started it going away doesn't cancel it for everyone else. With
+    `ttl` > 0 a finished result is also reused for `ttl` seconds when `cacheable(result)`
+    allows it. `run` is only called on the event loop thread, so there are no locks;
+    `invalidate` may be called from any thread.
+    """
+    def __init__(self, ttl=0.0, maxsize=256, cacheable=lambda result: True):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.cacheable = cacheable
+        self._flights = {} # (generation, key) -> Task
+        self._done = OrderedDict() # key -> (expires_at, generation, result)
+        self._generation = 0 # Bumped by invalidate, older results are ignored
+        self.leaders = self.coalesced = self.reused = 0
+
+    async def run(self, key, fn):
+        hit = self._done.get(key)
+        if hit is not None:
+            if hit[0] > time.monotonic() and hit[1] == self._generation:
+                self.reused += 1
+                return hit[2]
+            del self._done[key]
+        flight = (self._generation, key) # Work started before an invalidate is never joined
+        task = self._flights.get(flight)
+        if task is None:
+            task = self._flights[flight] = asyncio.ensure_future(fn())
+            task.add_done_callback(partial(self._finish, flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, flight, task):
+        del self._flights[flight]
+        generation, key = flight
+        if task.cancelled() or task.exception() is not None: # exception() also marks it retrieved
+            return
+        if self.ttl > 0 and self.maxsize > 0 and generation == self._generation and self.cacheable(task.result()):
+            self._done[key] = (time.monotonic() + self.ttl, generation, task.result())
+            self._done.move_to_end(key)
+            while len(self._done) > self.maxsize:
+                self._done.popitem(last=False)
+
+    def invalidate(self):
+        "Stop reusing finished results, including those of flights still running."
+        self._generation += 1
+
+    def stats(self):
+        return {'in_flight': len(self._flights), 'leaders': self.leaders, 'coalesced': self.coalesced, 'reused': self.reused}
@@ -0,0 +1,84 @@
+import threading
+import time
+
+class GuestbookStats:
+    """Materialized guestbook counters: total messages, unique authors and messages today.
+
+    Loaded with one counting query (`store.counts`), which sends the totals and the distinct
+    author names rather than the rows, then kept current by `add` for every insert, so
+    reading them costs no query. `maybe_reconcile` recounts in the background every
+    `reconcile_interval` seconds, or sooner after `mark_due` (another worker inserted).
+    `today` is a callable returning the current date string in the guestbook's time zone,
+    `day_of` maps a row to the same kind of string and `day_start` returns the epoch at
+    which the current day began.
+    """
+    def __init__(self, store, today, day_of, day_start, reconcile_interval=600.0):
+        self.store = store
+        self.today = today
+        self.day_of = day_of
+        self.day_start = day_start
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._reconciling = threading.Lock()
+        self.loaded = False
+        self.total = self.day_count = self.max_id = 0
+        self.authors = set() # Casefolded names
+        self.day = None # Set on first use, so building the stats needs no time zone data yet
+        self.last_reconcile = 0.0
+
+    def add(self, rows):
+        with self._lock:
+            for row in sorted(rows, key=lambda r: r["id"]):
+                if row["id"] <= self.max_id: # Already counted
+                    continue
+                self.max_id = row["id"]
+                self.total += 1
+                self.authors.add(row["name"].casefold())
+                if self.day is None:
+                    self.day = self.today()
+                if self.day_of(row) == self.day:
+                    self.day_count += 1
+
+    def mark_due(self):
+        "Recount on the next `maybe_reconcile`, e.g. after a write this process didn't count."
+        self.last_reconcile = 0.0
+
+    def reconcile(self):
+        "Recount everything in the backend and swap the result in."
+        if not self._reconciling.acquire(blocking=False):
+            return # Already running
+        try:
+            day = self.today()
+            counts = self.store.counts(self.day_start())
+            with self._lock:
+                # Rows added while we were counting have ids above the count's newest one
+                newer = self.max_id > counts["max_id"]
+                self.total, self.day, self.day_count = counts["messages"], day, counts["today"]
+                self.authors = {name.casefold() for name in counts["names"]}
+                self.max_id = max(self.max_id, counts["max_id"])
+                self.loaded = True
+            if newer:
+                self.mark_due() # Counts for those rows were dropped
+            else:
+                self.last_reconcile = time.monotonic()
+        except Exception as e:
+            print(f"Error reconciling guestbook stats: {e}")
+            self.last_reconcile = time.monotonic()
+        finally:
+            self._reconciling.release()
+
+    def maybe_reconcile(self, executor):
+        "Schedule a background reconcile on `executor` when the counters are due."
+        if time.monotonic() - self.last_reconcile > self.reconcile_interval and not self._reconciling.locked():
+            self.last_reconcile = time.monotonic()
+            executor.submit(self.reconcile)
+
+    def snapshot(self):
+        with self._lock:
+            today = self.today()
+            if self.day is None:
+                self.day = today
+            elif today != self.day: # Midnight passed since the last message
+                self.day, self.day_count = today, 0
+            return {'loaded': self.loaded, 'messages': self.total, 'authors': len(self.authors),
+                    'today': self.day_count}
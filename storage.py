@@ -0,0 +1,247 @@
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from sqlite_minutils import Database
+
+TABLE = "myGuestbook"
+SERVER_ERROR_CODES = ("5", "08", "PGRST000", "PGRST001", "PGRST002", "PGRST003")
+SQLITE_TRANSIENT = {5, 6, 10, 13, 14} # BUSY, LOCKED, IOERR, FULL, CANTOPEN
+
+class MessageStore(ABC):
+    """Backend interface used by main.py. Rows are dicts with `id`, `name`, `message` and `created_at`
+    (UTC epoch seconds); rows written before `created_at` existed carry a `timestamp` string instead."""
+    backend_errors = (OSError,)
+
+    def is_backend_error(self, error):
+        """Whether `error` means the backend or the way to it failed, rather than the call being
+        wrong; only these are retried and count against the circuit breaker (see resilience.py)."""
+        return isinstance(error, self.backend_errors)
+
+    @abstractmethod
+    def insert(self, rows):
+        "Insert `rows` and return them as stored (with their new ids)."
+
+    @abstractmethod
+    def fetch(self, limit, before=None, offset=0):
+        "Newest-first rows; `id < before` when a cursor is given, otherwise skip `offset` rows."
+
+    @abstractmethod
+    def max_id(self):
+        "Id of the newest message, or 0 when there are none."
+
+    @abstractmethod
+    def scan(self, after=0, limit=1000, columns="*"):
+        "Oldest-first rows with `id > after`, for walking the whole table one keyset chunk at a time."
+
+    @abstractmethod
+    def counts(self, since):
+        """The number of `messages`, the distinct author `names` (lower-cased, at most one per
+        visitor), messages created at or after the epoch `since` (`today`) and the newest id
+        (`max_id`), all from one consistent read; no message rows are sent."""
+
+    @abstractmethod
+    def get_by_ids(self, ids):
+        "Rows for the given ids, in no particular order; unknown ids are skipped."
+
+    @abstractmethod
+    def fetch_since(self, since, limit):
+        "Newest-first rows with `created_at >= since`, served from the `created_at` index."
+
+    @abstractmethod
+    def set_created_at(self, rows):
+        "Store `created_at` on existing rows (full rows as returned by `scan`), used by the backfill."
+
+class SupabaseStore(MessageStore):
+    """Supabase (PostgREST) backend. One client per process: its HTTP session keeps
+    connections alive between calls, and `timeout` bounds every request."""
+    def __init__(self, url, key, timeout=5.0):
+        import httpx
+        from postgrest.exceptions import APIError
+        from supabase import ClientOptions, create_client
+        self.backend_errors = (OSError, httpx.HTTPError)
+        self._api_error = APIError
+        self.client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=timeout))
+
+    def is_backend_error(self, error):
+        # APIError is raised for every error response. Only server-side failures count: an HTTP
+        # 5xx code, Postgres classes 5x (resources, shutdown, system) and 08 (connection), and
+        # PostgREST's PGRST000-003 (can't reach the database, timeout); the rest are bad requests
+        if isinstance(error, self._api_error):
+            return str(error.code).startswith(SERVER_ERROR_CODES)
+        return isinstance(error, self.backend_errors)
+
+    def insert(self, rows):
+        return self.client.table(TABLE).insert(rows).execute().data
+
+    def fetch(self, limit, before=None, offset=0):
+        query = self.client.table(TABLE).select("*").order("id", desc=True)
+        if before is not None:
+            query = query.lt("id", before).limit(limit)
+        else:
+            query = query.range(offset, offset + limit - 1) # range is inclusive
+        return query.execute().data
+
+    def max_id(self):
+        data = self.client.table(TABLE).select("id").order("id", desc=True).limit(1).execute().data
+        return data[0]["id"] if data else 0
+
+    def scan(self, after=0, limit=1000, columns="*"):
+        return self.client.table(TABLE).select(columns).gt("id", after).order("id").limit(limit).execute().data
+
+    def get_by_ids(self, ids):
+        return self.client.table(TABLE).select("*").in_("id", list(ids)).execute().data
+
+    def counts(self, since):
+        # PostgREST can't count distinct values, so this calls the SQL function from the README
+        return self.client.rpc("guestbook_counts", {"since": since}).execute().data
+
+    def fetch_since(self, since, limit):
+        return self.client.table(TABLE).select("*").gte("created_at", since).order("created_at", desc=True).limit(limit).execute().data
+
+    def set_created_at(self, rows):
+        # One round trip per batch; full rows, because an upsert must also satisfy the insert path
+        self.client.table(TABLE).upsert(list(rows)).execute()
+
+class SQLiteStore(MessageStore):
+    """Local SQLite backend for single-node deployments, benchmarks and load tests.
+
+    Runs in WAL mode so readers never wait on the writer, gives every db worker thread
+    its own connection, and only uses fixed parameterised SQL so sqlite's statement
+    cache keeps them prepared. `id` is the rowid, so keyset scans walk the primary index.
+    """
+    INSERT_SQL = f'INSERT INTO "{TABLE}" (name, message, timestamp, created_at) VALUES (?, ?, ?, ?) RETURNING *'
+    FETCH_BEFORE_SQL = f'SELECT * FROM "{TABLE}" WHERE id < ? ORDER BY id DESC LIMIT ?'
+    FETCH_OFFSET_SQL = f'SELECT * FROM "{TABLE}" ORDER BY id DESC LIMIT ? OFFSET ?'
+    MAX_ID_SQL = f'SELECT coalesce(max(id), 0) FROM "{TABLE}"'
+    SCAN_SQL = 'SELECT {columns} FROM "%s" WHERE id > ? ORDER BY id LIMIT ?' % TABLE
+    COUNTS_SQL = f'SELECT count(*), coalesce(sum(created_at >= ?), 0), coalesce(max(id), 0) FROM "{TABLE}"'
+    NAMES_SQL = f'SELECT DISTINCT casefold(name) FROM "{TABLE}"'
+    FETCH_SINCE_SQL = f'SELECT * FROM "{TABLE}" WHERE created_at >= ? ORDER BY created_at DESC LIMIT ?'
+    SET_CREATED_AT_SQL = f'UPDATE "{TABLE}" SET created_at = ? WHERE id = ?'
+    COLUMNS = ("id", "name", "message", "timestamp", "created_at")
+
+    def is_backend_error(self, error):
+        # A locked, unreadable or full database; not a bad query ("no such column" is also an OperationalError)
+        if isinstance(error, sqlite3.OperationalError):
+            return getattr(error, "sqlite_errorcode", 0) & 0xff in SQLITE_TRANSIENT
+        return isinstance(error, self.backend_errors)
+
+    def __init__(self, path="guestbook.db"):
+        self.path = path
+        self._local = threading.local()
+        db = self._db()
+        db.enable_wal()
+        db[TABLE].create({"id": int, "name": str, "message": str, "timestamp": str, "created_at": int}, pk="id", if_not_exists=True)
+        if "created_at" not in db[TABLE].columns_dict: # Database from before created_at
+            db[TABLE].add_column("created_at", int)
+        db.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{TABLE}_created_at" ON "{TABLE}" (created_at)')
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = Database(self.path)
+            db.conn.execute("PRAGMA synchronous=NORMAL") # Safe with WAL, avoids an fsync per commit
+            db.conn.create_function("casefold", 1, str.casefold, deterministic=True)
+        return db
+
+    def _rows(self, cursor):
+        keys = [d[0] for d in cursor.description]
+        return [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+    def insert(self, rows):
+        conn = self._db().conn
+        inserted = []
+        conn.execute("BEGIN")
+        try:
+            for row in rows:
+                cursor = conn.execute(self.INSERT_SQL, (row["name"], row["message"], row.get("timestamp"), row.get("created_at")))
+                inserted.extend(self._rows(cursor))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return inserted
+
+    def fetch(self, limit, before=None, offset=0):
+        conn = self._db().conn
+        if before is not None:
+            return self._rows(conn.execute(self.FETCH_BEFORE_SQL, (before, limit)))
+        return self._rows(conn.execute(self.FETCH_OFFSET_SQL, (limit, offset)))
+
+    def max_id(self):
+        return self._db().conn.execute(self.MAX_ID_SQL).fetchone()[0]
+
+    def scan(self, after=0, limit=1000, columns="*"):
+        if columns != "*": # Column names can't be parameters, so only known ones are allowed
+            cols = [c.strip() for c in columns.split(",")]
+            if not set(cols) <= set(self.COLUMNS):
+                raise ValueError(f"Unknown columns: {columns!r}")
+            columns = ", ".join(cols)
+        return self._rows(self._db().conn.execute(self.SCAN_SQL.format(columns=columns), (after, limit)))
+
+    def get_by_ids(self, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        placeholders = ", ".join("?" * len(ids))
+        return self._rows(self._db().conn.execute(f'SELECT * FROM "{TABLE}" WHERE id IN ({placeholders})', ids))
+
+    def counts(self, since):
+        conn = self._db().conn
+        conn.execute("BEGIN") # Both reads see the same snapshot
+        try:
+            messages, today, max_id = conn.execute(self.COUNTS_SQL, (since,)).fetchone()
+            names = [name for name, in conn.execute(self.NAMES_SQL)]
+        finally:
+            conn.execute("COMMIT")
+        return {"messages": messages, "names": names, "today": today, "max_id": max_id}
+
+    def fetch_since(self, since, limit):
+        return self._rows(self._db().conn.execute(self.FETCH_SINCE_SQL, (since, limit)))
+
+    def set_created_at(self, rows):
+        conn = self._db().conn
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(self.SET_CREATED_AT_SQL, [(row["created_at"], row["id"]) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+class LazyStore:
+    """Creates the real store on first use and keeps it.
+
+    Importing the app then never waits for a backend client (the Supabase SDK alone takes
+    around 0.4 s to import), and warm serverless invocations reuse the one instance.
+    """
+    def __init__(self, factory):
+        self._factory = factory
+        self._store = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._factory()
+        return self._store
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+def iter_rows(store, columns="*", chunk_size=1000, after=0):
+    "Every row, oldest first, fetched one keyset chunk at a time so memory stays constant."
+    while True:
+        rows = store.scan(after=after, limit=chunk_size, columns=columns)
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1]["id"]
+
+def create_store(backend="supabase", supabase_url=None, supabase_key=None, sqlite_path="guestbook.db", timeout=5.0):
+    if backend == "supabase":
+        return SupabaseStore(supabase_url, supabase_key, timeout=timeout)
+    if backend == "sqlite":
+        return SQLiteStore(sqlite_path)
+    raise ValueError(f"Unknown GUESTBOOK_BACKEND: {backend!r} (expected 'supabase' or 'sqlite')")
@@ -0,0 +1,32 @@
+"""
+Validation and escaping of a submitted name and message, shared by the app's routes and
+`cli.py import` so the command doesn't have to load the app.
+"""
+import html
+
+from timestamps import now
+
+MAX_NAME_CHAR = 30
+MAX_MESSAGE_CHAR = 500
+
+def prepare_message(name, message):
+    "Validate and escape a submission; returns the row to insert, or None if it is rejected."
+    # Validate input
+    if not name or not name.strip():
+        print("Error: Name cannot be empty or just whitespace.")
+        return None
+    if not message or not message.strip():
+        print("Error: Message cannot be empty or just whitespace.")
+        return None
+    if len(name.strip()) > MAX_NAME_CHAR:
+        print(f"Error: Name exceeds maximum length of {MAX_NAME_CHAR}.")
+        return None
+    if len(message.strip()) > MAX_MESSAGE_CHAR:
+        print(f"Error: Message exceeds maximum length of {MAX_MESSAGE_CHAR}.")
+        return None
+
+    # Sanitize input
+    sanitized_name = html.escape(name.strip())
+    sanitized_message = html.escape(message.strip())
+
+    return {"name": sanitized_name, "message": sanitized_message, "created_at": now()}
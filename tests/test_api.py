@@ -0,0 +1,33 @@
+import html
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api import FIELDS, encode_messages, parse_fields, parse_ids
+
+def test_pages_decode_to_the_rows_with_plain_text():
+    rng = random.Random(25)
+    pieces = ["Ann", "&amp;", "&lt;b&gt;", "&quot;", "&#x27;", "\\", "\n", "\t", "\x00", "é", "🙂", " ", " "]
+    text = lambda: "".join(rng.choice(pieces) for _ in range(rng.randint(0, 8)))
+    rows = [{"id": i, "name": text(), "message": text(), "created_at": rng.choice([None, rng.randint(0, 2**40)]),
+             "timestamp": rng.choice([None, "", text()])} for i in range(200, 0, -1)]
+    for fields in [FIELDS, ("id",), ("message", "id"), ("created_at", "timestamp")]:
+        page = json.loads(encode_messages(rows, fields, next_cursor=1))
+        expected = [{f: html.unescape(r[f]) if f in ("name", "message") else r[f] for f in fields} for r in rows]
+        assert page == {"data": expected, "next_cursor": 1}
+    assert json.loads(encode_messages([], FIELDS, stale=True)) == {"data": [], "next_cursor": None, "stale": True}
+
+def test_query_parsing():
+    assert parse_fields("") == FIELDS
+    assert parse_fields(" message,id,message ") == ("message", "id")
+    assert parse_ids("3, 1,3", 10) == (3, 1)
+    for bad in ["id,password", ",", "*"]:
+        with pytest.raises(ValueError):
+            parse_fields(bad)
+    for bad in ["1,x", "", "1,2,3"]:
+        with pytest.raises(ValueError):
+            parse_ids(bad, 2)
@@ -0,0 +1,401 @@
+"""In-process tests for the routes, run against a throwaway SQLite backend."""
+import asyncio
+import copy
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["GUESTBOOK_BACKEND"] = "sqlite"
+os.environ["GUESTBOOK_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="guestbook-test-"), "guestbook.db")
+
+import assets
+if assets.load_assets() == (None, None):
+    assets.build_assets() # The deploy build step; the app itself never builds
+import main
+from starlette.testclient import TestClient
+from stats import GuestbookStats
+from storage import SQLiteStore
+
+@pytest.fixture
+def client(monkeypatch):
+    main.guestbook_stats.reconcile() # Load the stats now rather than in the background
+    monkeypatch.setattr(main, "duplicate_filter", main.DuplicateFilter()) # Tests reuse message texts
+    return TestClient(main.app)
+
+sent = itertools.count()
+
+def add_messages(n):
+    for i in range(n):
+        assert main.add_message(f"Visitor {i}", f"Message {next(sent)}") # Unique, or they'd be dropped as duplicates
+
+def test_load_more_button_carries_cursor(client):
+    add_messages(12)
+    r = client.get("/messages?page=1", headers={"hx-request": "1"})
+    assert r.text.count("message-card") == 10
+    cursor = r.text.split('hx-get="/messages?before=')[1].split('"')[0]
+    r = client.get(f"/messages?before={cursor}", headers={"hx-request": "1"})
+    assert "message-card" in r.text and int(cursor) > 1
+
+def test_pages_report_has_more_and_next_cursor(client, empty_store):
+    add_messages(25) # Ids 1..25, ten per page
+    first = main.get_messages(page=1)
+    assert first['has_more'] and first['next_cursor'] == 16 and [m['id'] for m in first['data']] == list(range(25, 15, -1))
+    second = main.get_messages(before=16)
+    assert second['has_more'] and second['next_cursor'] == 6
+    last = main.get_messages(before=6)
+    assert not last['has_more'] and last['next_cursor'] is None and [m['id'] for m in last['data']] == [5, 4, 3, 2, 1]
+    legacy = main.get_messages(page=3) # Old ?page= links use an offset
+    assert legacy['data'] == last['data'] and not legacy['has_more'] and legacy['next_cursor'] is None
+    assert main.get_messages(page=2)['next_cursor'] == 6
+    exact = main.get_messages(before=11) # Exactly one page left: no empty page after it
+    assert len(exact['data']) == 10 and not exact['has_more']
+
+def test_page_below_one_is_the_first_page(client, empty_store):
+    add_messages(3)
+    for page in (0, -1):
+        r = client.get(f"/messages?page={page}", headers={"hx-request": "1"})
+        assert r.status_code == 200 and r.text.count("message-card") == 3
+    assert main.resilient_store.breaker.state == "closed"
+
+@pytest.mark.parametrize("query", ["before=6", "page=3"])
+def test_last_page_has_no_load_more_button(client, empty_store, query):
+    add_messages(25)
+    hx = {"hx-request": "1"}
+    assert 'hx-get="/messages?before=16"' in client.get("/messages?page=1", headers=hx).text
+    r = client.get(f"/messages?{query}", headers=hx)
+    assert r.text.count("message-card") == 5 and "load-more-button" not in r.text
+
+def test_conditional_get_returns_304_until_a_new_message(client):
+    add_messages(1)
+    r = client.get("/")
+    etag = r.headers["etag"]
+    assert r.status_code == 200 and r.headers["cache-control"] == "no-cache"
+    assert client.get("/", headers={"if-none-match": etag}).status_code == 304
+    assert client.get("/", headers={"if-none-match": etag, "hx-request": "1"}).status_code == 200 # Different variant
+    add_messages(1)
+    r = client.get("/", headers={"if-none-match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+
+def test_fingerprinted_assets_are_immutable_and_precompressed(client):
+    page = client.get("/").text
+    url = page.split('rel="stylesheet" href="/assets/build/')[1].split('"')[0]
+    r = client.get(f"/assets/build/{url}", headers={"accept-encoding": "gzip"})
+    assert r.status_code == 200 and "immutable" in r.headers["cache-control"]
+    assert r.headers["content-encoding"] == "gzip" and ".glass-card" in r.text
+    assert client.get("/assets/build/main.py").status_code == 404
+
+@pytest.fixture
+def empty_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "store", SQLiteStore(str(tmp_path / "guestbook.db")))
+    old = main.guestbook_stats
+    monkeypatch.setattr(main, "guestbook_stats", GuestbookStats(main.store, old.today, old.day_of, old.day_start, old.reconcile_interval))
+    main.guestbook_stats.reconcile()
+    main.invalidate_pages()
+    main.fragment_cache.invalidate() # Ids restart at 1 in the new store
+    main.stale_pages.invalidate()
+    main._latest.update(id=None, checked=0.0) # Re-read the newest id from the new store
+
+@pytest.mark.parametrize("headers", [{}, {"hx-request": "1"}])
+@pytest.mark.parametrize("n", [0, 1, 12])
+def test_page_shell_is_byte_identical_to_ft_page(client, empty_store, monkeypatch, headers, n):
+    add_messages(n)
+    monkeypatch.setattr(main, "PAGE_SHELL", True)
+    shell = client.get("/", headers=headers)
+    monkeypatch.setattr(main, "PAGE_SHELL", False)
+    ft = client.get("/", headers=headers)
+    assert shell.status_code == ft.status_code == 200
+    assert shell.text.count("message-card") == min(n, main.MESSAGES_PER_PAGE)
+    assert shell.content == ft.content
+    assert shell.headers["etag"] == ft.headers["etag"]
+
+def test_stats_count_new_messages_without_a_query(client, empty_store, monkeypatch):
+    add_messages(3)
+    assert main.add_message("Visitor 0", "Again")
+    counts = main.store.counts
+    monkeypatch.setattr(main.store, "counts", None) # Reading the stats must not touch the backend
+    stats = main.guestbook_stats.snapshot()
+    assert (stats['messages'], stats['authors'], stats['today']) == (4, 3, 4)
+    assert time.monotonic() - main.guestbook_stats.last_reconcile < main.STATS_RECONCILE_INTERVAL # No recount due
+    assert '<h3 class="stat-number">4</h3>' in client.get("/").text
+    monkeypatch.setattr(main.store, "counts", counts)
+    monkeypatch.setattr(main.store, "scan", None) # Recounting is one query, not a scan
+    main.guestbook_stats.reconcile()
+    assert main.guestbook_stats.snapshot() == stats
+
+def test_search_finds_new_messages_and_clears_back_to_the_list(client, empty_store, monkeypatch):
+    monkeypatch.setattr(main, "search_index", main.SearchIndex())
+    add_messages(3)
+    assert main.add_message("Zed", "Greetings from Zürich")
+    r = client.get("/search?q=z%C3%BCr", headers={"hx-request": "1"})
+    assert r.text.count("message-card") == 1 and "Zürich" in r.text
+    assert "No matching messages" in client.get("/search?q=nothing", headers={"hx-request": "1"}).text
+    assert client.get("/search?q=", headers={"hx-request": "1"}).text.count("message-card") == 4
+
+def test_submissions_over_the_rate_limit_get_429_without_an_insert(client, empty_store, monkeypatch):
+    monkeypatch.setattr(main, "rate_limiter", main.RateLimiter(rate=0.01, burst=2))
+    inserts = []
+    monkeypatch.setattr(main, "insert_messages", lambda rows: inserts.append(rows) or rows)
+    posts = [client.post("/submit-message", data={"name": "Spammer", "message": f"Buy now {i}"}) for i in range(4)]
+    assert [r.status_code for r in posts] == [200, 200, 429, 429]
+    r = posts[-1]
+    assert r.status_code == 429 and int(r.headers["retry-after"]) > 0
+    assert len(inserts) == 2 and main.rate_limiter.stats()['rejected'] == 2
+
+def test_over_limit_posts_are_answered_before_routing(client, empty_store, monkeypatch):
+    monkeypatch.setattr(main, "rate_limiter", main.RateLimiter(rate=0.01, burst=1))
+    route = 'guestbook_request_seconds_count{route="/submit-message",method="POST",status="429"}'
+    before = metric(client.get("/metrics").text, route)
+    assert client.post("/submit-message", data={"name": "Ann", "message": "Hi"}).status_code == 200
+    assert client.post("/submit-message").status_code == 429 # Not 400: the missing form fields are never read
+    assert metric(client.get("/metrics").text, route) == before + 1
+
+def test_double_submit_is_dropped_before_the_insert(client, empty_store):
+    form = {"name": "Alice", "message": "Hello!"}
+    client.post("/submit-message", data=form)
+    client.post("/submit-message", data={"name": " alice", "message": "hello"})
+    assert main.store.max_id() == 1 and main.duplicate_filter.stats()['duplicates'] == 1
+
+def metric(text, series):
+    return next((float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(series + " ")), 0)
+
+def test_metrics_report_route_phases_and_backend_errors(client, monkeypatch):
+    route = 'guestbook_request_seconds_count{route="/messages",method="GET",status="200"}'
+    errors = 'guestbook_backend_errors_total{operation="fetch"}'
+    before = client.get("/metrics").text
+    client.get("/messages?page=1", headers={"hx-request": "1"})
+    main.invalidate_pages()
+    def fail(*args, **kwargs):
+        raise ConnectionError("backend down")
+    monkeypatch.setattr(main.store, "attempts", 1) # No retries, one failed call
+    monkeypatch.setattr(main.store.store.store, "fetch", fail) # The backend under ResilientStore and TimedStore
+    client.get("/messages?page=1", headers={"hx-request": "1"})
+    text = client.get("/metrics").text
+    assert metric(text, route) == metric(before, route) + 2
+    assert metric(text, errors) == metric(before, errors) + 1
+    assert 'guestbook_request_phase_seconds_count{route="/messages",phase="serialize"}' in text
+    assert "guestbook_requests_in_flight 1" in text # The scrape itself
+
+def test_message_times_follow_the_tz_cookie(client, empty_store):
+    add_messages(1)
+    ist = client.get("/messages?page=1", headers={"hx-request": "1"})
+    utc = client.get("/messages?page=1", headers={"hx-request": "1"}, cookies={"tz": "UTC"})
+    bogus = client.get("/messages?page=1", headers={"hx-request": "1"}, cookies={"tz": "Not/AZone"})
+    assert " IST</span>" in ist.text and " UTC</span>" in utc.text and bogus.text == ist.text
+    assert ist.headers["etag"] != utc.headers["etag"]
+    assert main.store.fetch(1)[0]["timestamp"] is None # Only the instant is stored
+
+def test_export_streams_every_message(client, empty_store, monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_CHUNK", 3)
+    add_messages(7)
+    assert client.get("/export.ndjson").status_code == 404 # No token configured, no export
+    monkeypatch.setattr(main, "EXPORT_TOKEN", "s3cret")
+    assert client.get("/export.ndjson").status_code == 401
+    r = client.get("/export.ndjson", headers={"authorization": "Bearer s3cret"})
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert [l["id"] for l in lines] == list(range(1, 8))
+
+def test_backend_outage_serves_the_last_good_page_marked_stale(client, empty_store, monkeypatch):
+    add_messages(3)
+    hx = {"hx-request": "1"}
+    assert "stale-notice" not in client.get("/messages?page=1", headers=hx).text
+    def fail(*args, **kwargs):
+        raise ConnectionError("backend down")
+    monkeypatch.setattr(main.store, "fetch", fail)
+    main.invalidate_pages()
+    r = client.get("/messages?page=1", headers=hx)
+    assert "stale-notice" in r.text and r.text.count("message-card") == 3
+    assert r.headers["cache-control"] == "no-store" and "etag" not in r.headers
+    main.stale_pages.invalidate()
+    r = client.get("/")
+    assert r.status_code == 200 and "Messages are unavailable" in r.text and "No messages yet" not in r.text
+
+def test_concurrent_identical_reads_share_one_backend_fetch(empty_store, monkeypatch):
+    add_messages(3)
+    calls = []
+    fetch = main.store.fetch
+    def slow_fetch(*args, **kwargs):
+        calls.append(1)
+        time.sleep(0.05) # Every request arrives while the first fetch is still running
+        return fetch(*args, **kwargs)
+    monkeypatch.setattr(main.store, "fetch", slow_fetch)
+    monkeypatch.setattr(main.page_flights, "ttl", 0)
+    async def burst():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as c:
+            return await asyncio.gather(*(c.get("/messages?page=1", headers={"hx-request": "1"}) for _ in range(20)))
+    coalesced = main.page_flights.coalesced
+    responses = asyncio.run(burst())
+    assert len(calls) == 1 and main.page_flights.coalesced == coalesced + 19
+    assert len({r.text for r in responses}) == 1 and responses[0].text.count("message-card") == 3
+    assert responses[0].headers["etag"]
+
+def test_slow_backend_call_does_not_block_other_requests(client, empty_store, monkeypatch):
+    add_messages(12)
+    hx = {"hx-request": "1"}
+    client.get("/messages?page=1", headers=hx) # Cached, so it needs no backend call
+    fetch = main.store.fetch
+    def slow_fetch(*args, **kwargs):
+        time.sleep(0.5)
+        return fetch(*args, **kwargs)
+    monkeypatch.setattr(main.store, "fetch", slow_fetch)
+    async def timed(c, url):
+        await c.get(url, headers=hx)
+        return time.perf_counter()
+    async def both():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as c:
+            slow = asyncio.create_task(timed(c, "/messages?before=3"))
+            await asyncio.sleep(0.05) # The slow fetch is under way
+            start = time.perf_counter()
+            fast_done = await timed(c, "/messages?page=1")
+            return start, fast_done, await slow
+    start, fast_done, slow_done = asyncio.run(both())
+    assert fast_done - start < 0.25 and fast_done < slow_done
+
+def test_shared_cache_serves_other_workers_and_carries_their_invalidations(client, empty_store, monkeypatch, tmp_path):
+    from sharedcache import SharedCache
+    path = str(tmp_path / "cache.db")
+    monkeypatch.setattr(main, "shared_cache", SharedCache(path))
+    add_messages(1)
+    hx = {"hx-request": "1"}
+    r = client.get("/messages?page=1", headers=hx)
+    assert r.text.count("message-card") == 1
+    other = SharedCache(path) # A second worker inserts a message
+    inserted = main.store.insert([main.prepare_message("Other worker", f"Message {next(sent)}")])
+    other.invalidate(inserted[0]["id"])
+    r2 = client.get("/messages?page=1", headers={**hx, "if-none-match": r.headers["etag"]})
+    assert r2.status_code == 200 and r2.text.count("message-card") == 2
+    main.page_cache.invalidate() # This worker's own cache only; the shared copy answers
+    def fail(*args, **kwargs):
+        raise ConnectionError("backend down")
+    monkeypatch.setattr(main.store, "fetch", fail)
+    main.page_flights.invalidate()
+    r3 = client.get("/messages?page=1", headers=hx)
+    assert r3.text == r2.text and "stale-notice" not in r3.text
+
+def test_unwritten_queued_messages_are_saved_and_can_be_sent_again(client, empty_store, monkeypatch, tmp_path):
+    log = tmp_path / "failed.ndjson"
+    monkeypatch.setattr(main, "WRITE_BEHIND_FAILED_LOG", str(log))
+    row = main.prepare_message("Ann", "Fish & chips")
+    assert main.duplicate_filter.claim(row['name'], row['message'])
+    main.save_unwritten([row])
+    assert json.loads(log.read_text())["message"] == "Fish & chips" # Unescaped, ready for cli.py import
+    assert main.add_message("Ann", "Fish & chips") # The claim was released
+
+def test_failures_after_a_committed_insert_are_not_a_failed_submission(client, empty_store, monkeypatch):
+    def broken(rows):
+        raise RuntimeError("index broken")
+    monkeypatch.setattr(main.search_index, "add", broken)
+    assert main.post_message("Ann", "Still stored")[0] == "published"
+    assert main.store.max_id() == 1 and main.guestbook_stats.snapshot()['messages'] == 1 # Later steps still ran
+    assert main.post_message("Ann", "Still stored")[0] == "duplicate" # The claim was kept
+
+def test_blocklisted_submissions_are_held_not_published(client, empty_store, monkeypatch, tmp_path):
+    from moderation import ModerationQueue, Moderator
+    blocklist, log = tmp_path / "blocklist.txt", tmp_path / "held.ndjson"
+    blocklist.write_text("buy followers\n")
+    monkeypatch.setattr(main, "moderator", Moderator(str(blocklist)).start())
+    monkeypatch.setattr(main, "moderation_queue", ModerationQueue(str(log)).start())
+    assert not main.add_message("Spammer", "Cheap! BUY   followers today")
+    assert main.add_message("Visitor", "Lovely site, no need to buy anything")
+    main.moderation_queue.close()
+    assert client.get("/messages?page=1", headers={"hx-request": "1"}).text.count("message-card") == 1
+    assert json.loads(log.read_text())["matches"] == ["buy followers"]
+    assert "guestbook_moderation_held_total 1" in client.get("/metrics").text
+    main.moderator.close()
+
+def test_fast_render_matches_the_ft_components():
+    rng = random.Random(24)
+    pieces = ["Ann", "Bob", "&", "<b>", "&amp;", "\"q\"", "it's", "é", "日本", "🙂", "x>y", "  ", "\n", "O'Neil"]
+    text = lambda: "".join(rng.choice(pieces + [" "]) for _ in range(rng.randint(1, 8)))
+    for i in range(300):
+        entry = {'id': i, 'name': text(), 'message': text()}
+        if i % 3:
+            entry['created_at'] = rng.randint(1_600_000_000, 1_800_000_000)
+        else:
+            entry['timestamp'] = rng.choice(["", "2024-05-01 10:00:00 AM IST", text()])
+        for tz in ("Asia/Kolkata", "UTC", "America/New_York"):
+            assert main.render_message_fast(entry, tz) == main.to_xml(main.render_message(entry, tz))
+
+def test_second_render_of_a_card_is_a_fragment_cache_hit(monkeypatch):
+    monkeypatch.setattr(main, "fragment_cache", main.PageCache(maxsize=8, ttl=float("inf")))
+    entry = {'id': 7, 'name': "Ann", 'message': "Hi &amp; bye", 'created_at': 1735700000}
+    first = main.render_message_html(entry, "UTC")
+    assert main.fragment_cache.stats()['hits'] == 0
+    assert main.render_message_html(entry, "UTC") == first and main.fragment_cache.stats()['hits'] == 1
+    other_zone = main.render_message_html(entry, "Asia/Tokyo") # Another key, rendered fresh
+    assert other_zone != first and main.fragment_cache.stats()['hits'] == 1
+    assert first == main.to_xml(main.render_message(entry, "UTC")).rstrip("\n")
+
+def test_api_pages_by_cursor_and_revalidates(client, empty_store):
+    add_messages(12)
+    first = client.get("/api/v1/messages?limit=5&fields=id,name")
+    assert first.headers["content-type"] == "application/json" and "vary" not in first.headers
+    ids, cursor = [m["id"] for m in first.json()["data"]], first.json()["next_cursor"]
+    while cursor is not None:
+        page = client.get(f"/api/v1/messages?limit=5&fields=id&before={cursor}").json()
+        ids += [m["id"] for m in page["data"]]
+        cursor = page["next_cursor"]
+    assert ids == list(range(12, 0, -1)) and set(first.json()["data"][0]) == {"id", "name"}
+    assert client.get("/api/v1/messages?limit=5&fields=id,name", headers={"if-none-match": first.headers["etag"]}).status_code == 304
+    assert client.get("/api/v1/messages?ids=3,99,1&fields=id").json()["data"] == [{"id": 3}, {"id": 1}]
+    assert client.get("/api/v1/messages?limit=1000").status_code == 400
+    assert client.get("/api/v1/messages?fields=id,password").status_code == 400
+
+def test_api_submissions_go_through_the_form_checks(client, empty_store, monkeypatch):
+    monkeypatch.setattr(main, "rate_limiter", main.RateLimiter(1 / 60, 4))
+    r = client.post("/api/v1/messages", json={"name": "Ann & Bob", "message": "<hi>"})
+    assert r.status_code == 201 and r.json()["message"] == "<hi>" and r.json()["id"] == 1
+    assert client.post("/api/v1/messages", json={"name": "Ann & Bob", "message": "<hi>"}).status_code == 409
+    assert client.post("/api/v1/messages", json={"name": " ", "message": "hi"}).status_code == 422
+    assert client.post("/api/v1/messages", json={"name": "Ann"}).status_code == 400
+    assert client.post("/api/v1/messages", json={"name": "Ann", "message": "again"}).status_code == 429
+    assert main.store.get_by_ids([1])[0]["message"] == "&lt;hi&gt;" # Stored escaped, as from the form
+    assert client.get("/api/v1/messages").json()["data"][0]["name"] == "Ann & Bob"
+
+def test_page_fetched_before_an_insert_is_not_cached_over_it(client, empty_store, monkeypatch):
+    add_messages(2)
+    fetch = main.store.fetch
+    def fetch_then_insert(*args, **kwargs):
+        rows = fetch(*args, **kwargs)
+        monkeypatch.setattr(main.store, "fetch", fetch)
+        main.insert_messages([main.prepare_message("Racer", "Landed mid-fetch")]) # Invalidates the cache
+        return rows
+    monkeypatch.setattr(main.store, "fetch", fetch_then_insert)
+    assert main.get_messages()['total_fetched'] == 2
+    assert main.get_messages()['data'][0]['name'] == "Racer"
+
+@pytest.mark.parametrize("headers", [[], [(b"hx-request", b"1")]])
+def test_serialize_ft_matches_fasthtml(headers):
+    from fasthtml.core import _xt_resp # The reference: what fasthtml itself sends for an FT response
+    from starlette.requests import Request
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+    router = main.app.router
+    request.hdrs, request.ftrs, request.htmlkw, request.bodykw = list(router.hdrs), list(router.ftrs), router.htmlkw, router.bodykw
+    for content in [main.render_page(main.Div("list"), main.Div("stats")), main.render_unavailable(5)]:
+        assert main.serialize_ft(request, content) == _xt_resp(request, content).body.decode()
+
+def test_metrics_can_require_a_token_or_be_off(client, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"authorization": "Bearer s3cret"}).status_code == 200
+    monkeypatch.setattr(main, "METRICS", False)
+    assert client.get("/metrics", headers={"authorization": "Bearer s3cret"}).status_code == 404
+
+def test_etags_leave_out_per_worker_counters(client, empty_store, monkeypatch):
+    add_messages(3)
+    page = client.get("/messages?page=1", headers={"hx-request": "1"})
+    api = client.get("/api/v1/messages")
+    stats = main.guestbook_stats
+    for name in ("total", "max_id", "authors"): # Restored afterwards
+        monkeypatch.setattr(stats, name, copy.copy(getattr(stats, name)))
+    stats.add([{"id": 10**9, "name": "Elsewhere", "message": "x", "created_at": 0}])
+    assert client.get("/messages?page=1", headers={"hx-request": "1", "if-none-match": page.headers["etag"]}).status_code == 304
+    assert client.get("/api/v1/messages", headers={"if-none-match": api.headers["etag"]}).status_code == 304
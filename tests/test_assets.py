@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from assets import build_assets, load_assets
+
+def test_manifest_is_used_only_while_source_hashes_match(tmp_path):
+    (tmp_path / "style.css").write_text("body { color: red; }\n" * 20)
+    assert load_assets(str(tmp_path)) == (None, None)
+    assert not (tmp_path / "build").exists() # Loading never builds
+    manifest = build_assets(str(tmp_path))
+    assert load_assets(str(tmp_path)) == (str(tmp_path / "build"), manifest)
+    os.utime(tmp_path / "style.css", (0, 0)) # A fresh checkout: new mtimes, same content
+    assert load_assets(str(tmp_path))[1] == manifest
+    (tmp_path / "style.css").write_text("body { color: blue; }\n")
+    assert load_assets(str(tmp_path)) == (None, None)
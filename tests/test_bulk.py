@@ -0,0 +1,64 @@
+import html
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bulk import import_records, iter_export, read_records
+from storage import SQLiteStore
+
+def prepare(name, message): # Stand-in for submission.prepare_message
+    if not name or not message:
+        return None
+    return {"name": html.escape(name), "message": html.escape(message), "created_at": 1}
+
+def test_export_import_round_trip_with_checkpoint(tmp_path):
+    source = SQLiteStore(str(tmp_path / "a.db"))
+    source.insert([{"name": "A &amp; B", "message": f"Hi &lt;{i}&gt;", "created_at": 100 + i} for i in range(25)])
+    source.insert([{"name": "Old", "message": "legacy", "timestamp": "2025-01-01 10:30:00 PM IST"}])
+    dump = tmp_path / "dump.ndjson"
+    dump.write_text("".join(iter_export(source, chunk_size=10)) + '{"name": "", "message": "invalid"}\n')
+    first = json.loads(dump.read_text().splitlines()[0])
+    assert (first["name"], first["message"], first["created_at"]) == ("A & B", "Hi <0>", 100)
+
+    target = SQLiteStore(str(tmp_path / "b.db"))
+    checkpoint = str(tmp_path / "dump.checkpoint")
+    records = list(read_records(str(dump)))
+    def crash_after_two_batches():
+        for i, r in enumerate(records):
+            if i == 20:
+                raise RuntimeError("killed")
+            yield r
+    try:
+        import_records(target, crash_after_two_batches(), prepare, batch=10, checkpoint=checkpoint, log=lambda m: None)
+    except RuntimeError:
+        pass
+    assert target.max_id() == 20
+    assert import_records(target, records, prepare, batch=10, checkpoint=checkpoint, log=lambda m: None) == (6, 1)
+    rows = list(target.scan(limit=100))
+    assert len(rows) == 26 and rows[0]["name"] == "A &amp; B" and rows[0]["created_at"] == 100
+    assert rows[-1]["created_at"] == 1735750800 # Parsed from the legacy timestamp
+
+def test_csv_import(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text("name,message,created_at\nAda,Hello,5\nBob,Hey,\n")
+    store = SQLiteStore(str(tmp_path / "c.db"))
+    assert import_records(store, read_records(str(path)), prepare, log=lambda m: None) == (2, 0)
+    assert [r["created_at"] for r in store.scan()] == [5, 1]
+
+def test_bad_records_are_rejected_not_fatal(tmp_path):
+    path = tmp_path / "in.ndjson"
+    path.write_text('{"name": "Ada", "message": "one"}\nnot json\n[1, 2]\n'
+                    '{"name": "Bob", "message": "two", "created_at": "yesterday"}\n{"name": "Cy", "message": "three"}\n')
+    store = SQLiteStore(str(tmp_path / "d.db"))
+    assert import_records(store, read_records(str(path)), prepare, log=lambda m: None) == (2, 3)
+    assert [r["name"] for r in store.scan()] == ["Ada", "Cy"]
+
+def test_completed_import_clears_its_checkpoint(tmp_path):
+    path, checkpoint = tmp_path / "held.ndjson", str(tmp_path / "held.ndjson.checkpoint")
+    path.write_text('{"name": "Ada", "message": "one"}\n{"name": "Bob", "message": "two"}\n')
+    store = SQLiteStore(str(tmp_path / "e.db"))
+    assert import_records(store, read_records(str(path)), prepare, batch=1, checkpoint=checkpoint, log=lambda m: None) == (2, 0)
+    assert not os.path.exists(checkpoint)
+    path.write_text('{"name": "Cy", "message": "three"}\n') # Reviewed lines removed, a new one added
+    assert import_records(store, read_records(str(path)), prepare, checkpoint=checkpoint, log=lambda m: None) == (1, 0)
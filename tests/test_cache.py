@@ -0,0 +1,36 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache import PageCache
+
+def test_hit_miss_and_lru_eviction():
+    cache = PageCache(maxsize=2, ttl=60)
+    assert cache.get(('page', 1, 10)) is None
+    cache.set(('page', 1, 10), 'p1')
+    cache.set(('page', 2, 10), 'p2')
+    assert cache.get(('page', 1, 10)) == 'p1' # p1 is now most recently used
+    cache.set(('before', 5, 10), 'c5')        # evicts p2
+    assert cache.get(('page', 2, 10)) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (1, 2, 1, 2)
+
+def test_ttl_expiry_and_invalidate():
+    cache = PageCache(maxsize=4, ttl=0.01)
+    cache.set('k', 'v')
+    time.sleep(0.02)
+    assert cache.get('k') is None
+    cache.ttl = 60
+    cache.set('k', 'v')
+    cache.invalidate()
+    assert cache.get('k') is None
+
+def test_set_computed_before_an_invalidate_is_dropped():
+    cache = PageCache(maxsize=4, ttl=60)
+    generation = cache.generation # A fetch starts...
+    cache.invalidate()            # ...an insert lands...
+    cache.set('page', 'pre-insert', generation)
+    assert cache.get('page') is None
+    cache.set('page', 'fresh', cache.generation)
+    assert cache.get('page') == 'fresh'
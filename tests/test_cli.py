@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cli import backfill
+from storage import SQLiteStore
+from timestamps import day_of, display_time, parse_legacy
+
+def test_backfill_converts_legacy_rows_in_batches(tmp_path):
+    store = SQLiteStore(str(tmp_path / "guestbook.db"))
+    store.insert([{"name": f"U{i}", "message": "m", "timestamp": f"2025-01-0{i} 10:30:00 PM IST"} for i in range(1, 6)])
+    store.insert([{"name": "Bad", "message": "m", "timestamp": "yesterday"}, {"name": "New", "message": "m", "created_at": 5}])
+    logs = []
+    assert backfill(store, batch=2, log=logs.append) == (5, 1)
+    assert len(logs) == 3 and "--after 4" in logs[1]
+    rows = {r["id"]: r for r in store.scan()}
+    assert rows[1]["created_at"] == parse_legacy("2025-01-01 10:30:00 PM IST") == 1735750800
+    assert rows[6]["created_at"] is None and rows[7]["created_at"] == 5
+    assert backfill(store, log=logs.append) == (0, 1) # Nothing left to do
+
+def test_display_and_day_follow_the_zone():
+    entry = {"created_at": 1735750800, "timestamp": None} # 2025-01-01 17:00 UTC
+    assert display_time(entry, "Asia/Kolkata") == "2025-01-01 10:30:00 PM IST"
+    assert display_time(entry, "America/New_York") == "2025-01-01 12:00:00 PM EST"
+    assert day_of(entry, "Pacific/Kiritimati") == "2025-01-02"
+    assert display_time({"timestamp": "2024-05-05 09:00:00 AM IST"}, "UTC") == "2024-05-05 09:00:00 AM IST"
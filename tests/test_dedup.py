@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dedup import BloomFilter, DuplicateFilter, fingerprint
+
+def test_exact_duplicates_within_the_window():
+    f = DuplicateFilter(window=60)
+    fp = f.claim("Alice", "Hello there!", now=0)
+    assert fp is not None
+    assert f.claim("alice ", "hello   there", now=1) is None # Same after normalizing
+    assert f.claim("Bob", "Hello there!", now=1) is not None
+    f.release(fp)                                             # Insert failed, the retry goes through
+    assert f.claim("Alice", "Hello there!", now=2) is not None
+    assert f.claim("Alice", "Hello there!", now=200) is not None
+    assert f.stats()['duplicates'] == 1
+
+def test_messages_without_words_are_told_apart():
+    f = DuplicateFilter(window=60)
+    assert f.claim("Alice", "🎉🎉", now=0)
+    assert f.claim("Alice", "❤️", now=1)
+    assert f.claim("Alice", "!!!", now=2)
+    assert f.claim("Alice", " ❤️ ", now=3) is None
+    assert f.claim("Alice", "&lt;3", now=4)            # Escaped as stored, but not "lt 3"
+    assert f.claim("Alice", "lt 3", now=5)
+    assert f.claim("Alice", "Fish &amp; chips", now=6)
+    assert f.claim("Alice", "fish amp chips", now=7)
+
+def test_evicted_fingerprints_stay_in_the_bloom_filter():
+    f = DuplicateFilter(window=60, exact_size=2, capacity=1000)
+    for i in range(5):
+        assert f.claim("Bot", f"Spam {i}", now=i)
+    assert f.stats()['recent'] == 2 and f.stats()['bloom_items'] == 3
+    assert f.claim("Bot", "Spam 0", now=10) is None
+    assert f.claim("Bot", "Spam 0", now=130) is not None    # Both Bloom generations rotated out
+
+def test_near_duplicates():
+    f = DuplicateFilter(window=60, near_distance=3)
+    assert f.claim("Bot", "Visit my amazing website for cheap watches and great deals today", now=0)
+    assert f.claim("Bot2", "Visit my amazing website for cheap watches and great deals today!!", now=1) is None
+    assert f.claim("Carol", "What a lovely guestbook, thanks for sharing your projects with us", now=1)
+    assert f.stats()['duplicates'] + f.stats()['near_duplicates'] == 1
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(10000, error_rate=1e-3)
+    for i in range(10000):
+        bloom.add(fingerprint("x", str(i)))
+    assert all(fingerprint("x", str(i)) in bloom for i in range(10000))
+    assert sum(fingerprint("y", str(i)) in bloom for i in range(10000)) < 50
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from feed import FeedHub
+
+async def take(gen, n):
+    return [await gen.__anext__() for _ in range(n)]
+
+def test_publish_fans_out_one_event_to_every_client():
+    async def run():
+        hub = FeedHub(buffer_size=4)
+        a, b = hub.events(keepalive=5), hub.events(keepalive=5)
+        await take(a, 1), await take(b, 1) # retry hints; both are subscribed now
+        hub.publish("<div>\n  hi\n</div>")
+        event = "event: message\ndata: <div>\ndata:   hi\ndata: </div>\n\n"
+        assert await take(a, 1) == [event] and await take(b, 1) == [event]
+        await a.aclose()
+        assert hub.client_count() == 1
+    asyncio.run(run())
+
+def test_slow_client_is_dropped():
+    async def run():
+        hub = FeedHub(buffer_size=2)
+        slow = hub.events(keepalive=5)
+        await take(slow, 1)
+        for i in range(3):
+            hub.publish(f"m{i}")
+        await asyncio.sleep(0)
+        assert hub.dropped == 1 and hub.client_count() == 0
+        try:
+            await slow.__anext__()
+        except StopAsyncIteration:
+            pass
+        else:
+            assert False, "dropped client should see the end of its stream"
+    asyncio.run(run())
+
+def test_each_key_gets_its_own_rendering_once():
+    async def run():
+        hub = FeedHub(buffer_size=4)
+        renders = []
+        def render(key):
+            renders.append(key)
+            return f"<p>{key}</p>"
+        a, b, c = hub.events(keepalive=5, key="UTC"), hub.events(keepalive=5, key="UTC"), hub.events(keepalive=5, key="Asia/Tokyo")
+        await take(a, 1), await take(b, 1), await take(c, 1)
+        hub.publish(render)
+        assert await take(a, 1) == await take(b, 1) == ["event: message\ndata: <p>UTC</p>\n\n"]
+        assert await take(c, 1) == ["event: message\ndata: <p>Asia/Tokyo</p>\n\n"]
+        assert sorted(renders) == ["Asia/Tokyo", "UTC"]
+        await c.aclose()
+        assert hub.client_count() == 2 and list(hub._clients) == ["UTC"]
+    asyncio.run(run())
@@ -0,0 +1,46 @@
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from moderation import Blocklist, ModerationQueue, Moderator
+
+def test_whole_words_phrases_and_substring_patterns():
+    blocklist = Blocklist([("he", False), ("she", False), ("hers", False), ("buy now", False), ("spam", True)])
+    assert blocklist.scan("Ushers and SHE said: hers! Buy   now, SPAMMERS") == ["she", "hers", "buy now", "spam"]
+    assert blocklist.scan("the shepherd") == [] # Whole-word patterns never match inside words
+
+def test_matches_agree_with_a_regex_for_every_pattern():
+    rng = random.Random(7)
+    patterns = [("".join(rng.choice("abc") for _ in range(rng.randint(1, 4))), rng.random() < 0.3) for _ in range(40)]
+    blocklist = Blocklist(patterns)
+    for _ in range(200):
+        text = "".join(rng.choice("abc  ") for _ in range(40))
+        expected = {p for p, anywhere in blocklist.patterns
+                    if re.search(re.escape(p) if anywhere else r"(?<!\w)%s(?!\w)" % re.escape(p), text)}
+        assert set(blocklist.scan(text)) == expected
+
+def test_blocklist_file_is_reloaded_when_it_changes(tmp_path):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("# Comments and blank lines are skipped\n\nbadword\n*spam\n")
+    moderator = Moderator(str(path), reload_interval=0.05).start()
+    assert moderator.scan("a BadWord here") == ["badword"]
+    path.write_text("other\n")
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9)) # A new mtime even on coarse filesystems
+    for _ in range(100):
+        if moderator.scan("other") == ["other"]:
+            break
+        time.sleep(0.02)
+    assert moderator.scan("other badword") == ["other"] and moderator.reloads == 2
+    moderator.close()
+
+def test_held_messages_are_written_for_review(tmp_path):
+    log = tmp_path / "held.ndjson"
+    held = ModerationQueue(str(log), capacity=1).start()
+    assert held.submit({"name": "A &amp; B", "message": "buy now", "created_at": 1735700000}, ["buy now"])
+    held.close()
+    assert json.loads(log.read_text()) == {"name": "A & B", "message": "buy now", "created_at": 1735700000, "matches": ["buy now"]}
+    assert held.stats()['written'] == 1
@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ratelimit import RateLimiter
+
+def test_burst_then_refill():
+    limiter = RateLimiter(rate=1.0, burst=2)
+    assert limiter.check("a", now=0) == 0 and limiter.check("a", now=0) == 0
+    assert limiter.check("a", now=0) == 1.0      # Empty, one token per second
+    assert limiter.check("b", now=0) == 0        # Other clients are unaffected
+    assert limiter.check("a", now=0.5) == 0.5
+    assert limiter.check("a", now=1.0) == 0
+    assert limiter.stats()['rejected'] == 2
+
+def test_memory_is_bounded_and_idle_keys_expire():
+    limiter = RateLimiter(rate=1.0, burst=2, max_keys=3)
+    for i in range(10):
+        limiter.check(i, now=0)
+    assert limiter.stats()['keys'] == 3
+    limiter.check("late", now=5)                 # Everything else has been idle past refill
+    assert limiter.stats()['keys'] == 1
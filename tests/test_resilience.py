@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resilience import CircuitBreaker, CircuitOpenError, ResilientStore
+from storage import SupabaseStore
+
+ROWS = [{"id": 2, "name": "B", "message": "yo", "created_at": 1735700002},
+        {"id": 1, "name": "A", "message": "hi", "created_at": 1735700001}]
+
+@pytest.fixture
+def fake_postgrest():
+    "A local stand-in for the Supabase REST API; `faults` failures (503) or `delay` seconds are injected per request."
+    state = {"requests": 0, "faults": 0, "delay": 0.0}
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["requests"] += 1
+            time.sleep(state["delay"])
+            if state["faults"]:
+                state["faults"] -= 1
+                self.send_response(503)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b'{"message": "unavailable", "code": "503"}')
+                return
+            body = json.dumps(ROWS).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", state
+    server.shutdown()
+
+def resilient(url, timeout=1.0, failures=3):
+    backend = SupabaseStore(url, "header.payload.signature", timeout=timeout)
+    return ResilientStore(backend, CircuitBreaker(failures=failures, reset_after=0.2), attempts=3, base_delay=0.01)
+
+def test_reads_are_retried_through_transient_faults(fake_postgrest):
+    url, state = fake_postgrest
+    store = resilient(url)
+    state["faults"] = 2
+    assert [r["id"] for r in store.fetch(2)] == [2, 1]
+    assert state["requests"] == 3 and store.retries == 2
+    assert store.breaker.state == "closed"
+
+def test_slow_backend_is_cut_off_by_the_timeout(fake_postgrest):
+    url, state = fake_postgrest
+    store = resilient(url, timeout=0.1)
+    state["delay"] = 0.5
+    start = time.monotonic()
+    with pytest.raises(Exception):
+        store.max_id()
+    assert time.monotonic() - start < 1.0 # Three attempts of 0.1 s, not three of 0.5 s
+
+def test_open_circuit_skips_the_network_until_it_recovers(fake_postgrest):
+    url, state = fake_postgrest
+    store = resilient(url, failures=3)
+    state["faults"] = 100
+    with pytest.raises(Exception):
+        store.fetch(2)
+    assert store.breaker.state == "open"
+    seen = state["requests"]
+    with pytest.raises(CircuitOpenError):
+        store.fetch(2)
+    assert state["requests"] == seen
+    time.sleep(0.25)
+    state["faults"] = 0
+    assert store.fetch(2) == ROWS # The half-open trial succeeds and closes the circuit
+    assert store.breaker.state == "closed"
+
+def test_failed_trial_reopens_and_inserts_are_not_retried():
+    breaker = CircuitBreaker(failures=1, reset_after=0.05)
+    calls = []
+    class Failing:
+        def insert(self, rows):
+            calls.append(rows)
+            raise ConnectionError("down")
+    store = ResilientStore(Failing(), breaker, attempts=3, base_delay=0)
+    with pytest.raises(ConnectionError):
+        store.insert([{"name": "A"}])
+    assert len(calls) == 1 and breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow() and not breaker.allow() # One trial call at a time
+    breaker.failure()
+    assert breaker.state == "open" and breaker.opened == 2
+
+def test_other_errors_are_raised_at_once_and_leave_the_breaker_closed():
+    calls = []
+    class Broken:
+        def fetch(self, limit, before=None, offset=0):
+            calls.append(before)
+            raise ValueError("bad cursor")
+    breaker = CircuitBreaker(failures=1)
+    store = ResilientStore(Broken(), breaker, attempts=3, base_delay=0)
+    with pytest.raises(ValueError):
+        store.fetch(25, before="x")
+    assert len(calls) == 1 and store.retries == 0 and breaker.state == "closed"
+
+def test_only_server_side_postgrest_errors_count(fake_postgrest):
+    from postgrest.exceptions import APIError
+    backend = SupabaseStore(fake_postgrest[0], "header.payload.signature")
+    for code in ("503", "PGRST001", "08006", "57014"):
+        assert backend.is_backend_error(APIError({"code": code, "message": "down"}))
+    for code in ("PGRST202", "42703", "2201X", None):
+        assert not backend.is_backend_error(APIError({"code": code, "message": "bad request"}))
+
+def test_bad_sqlite_queries_are_not_backend_errors(tmp_path):
+    import sqlite3
+    from storage import SQLiteStore
+    store = SQLiteStore(str(tmp_path / "guestbook.db"))
+    conn = store._db().conn
+    with pytest.raises(sqlite3.OperationalError) as bad_query:
+        conn.execute("SELECT nope FROM myGuestbook")
+    assert not store.is_backend_error(bad_query.value)
+    locked = sqlite3.OperationalError("database is locked")
+    locked.sqlite_errorcode = 5
+    assert store.is_backend_error(locked) and store.is_backend_error(ConnectionError())
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search import SearchIndex, tokenize
+
+ROWS = [
+    {"id": 1, "name": "Alice", "message": "Hello world"},
+    {"id": 2, "name": "Bob", "message": "Lovely site, hello!"},
+    {"id": 3, "name": "Carol", "message": "Nice work &amp; a great world"},
+]
+
+def test_tokenize_unescapes_and_folds_case():
+    assert tokenize("Nice &amp; WORK, d&#x27;oh") == ["nice", "work", "d", "oh"]
+
+def test_ranking_prefix_and_incremental_add():
+    index = SearchIndex()
+    index.build(ROWS)
+    assert index.ready and index.doc_count == 3
+    assert index.search("hello world")[0] == 1   # Only Alice matches both words
+    assert index.search("wor") == [3, 1]         # Prefix of the last word, newest first on ties
+    assert index.search("wor ") == []            # A finished word must match exactly
+    assert index.search("bob") == [2]
+    index.add([{"id": 4, "name": "Dave", "message": "worldwide hello"}])
+    index.add([ROWS[0]])                         # Seen twice (startup scan racing an insert)
+    assert index.doc_count == 4
+    assert set(index.search("world", prefix=False)) == {1, 3} and 4 in index.search("worl")
+
+def test_ensure_loaded_builds_once(tmp_path):
+    from storage import SQLiteStore
+    store = SQLiteStore(str(tmp_path / "guestbook.db"))
+    store.insert([{k: row[k] for k in ("name", "message")} for row in ROWS])
+    index = SearchIndex()
+    index.ensure_loaded(store)
+    store.scan = None # A second call must not scan again
+    index.ensure_loaded(store)
+    assert index.ready and index.search("hello") == [2, 1]
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sharedcache import SharedCache
+
+PAGE = {'data': [{'id': 1, 'name': 'A', 'message': 'hi'}], 'has_more': False, 'next_cursor': None}
+
+def test_workers_share_entries_and_invalidations(tmp_path):
+    path = str(tmp_path / "cache.db")
+    a, b = SharedCache(path), SharedCache(path) # Two workers
+    a.set("page-1", PAGE, a.generation())
+    assert b.get("page-1") == PAGE and b.stats()['hits'] == 1
+    assert a.poll() is None and b.poll() is None
+    b.invalidate(latest_id=7)
+    assert a.get("page-1") is None
+    assert a.poll() == 7 and a.poll() is None # Each broadcast is seen once
+    assert b.poll() is None # Not by the worker that sent it
+
+def test_results_computed_before_an_invalidate_are_never_served(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.db"))
+    generation = cache.generation()
+    cache.invalidate() # An insert lands while this worker is still fetching
+    cache.set("page-1", PAGE, generation)
+    assert cache.get("page-1") is None
+
+def test_trim_keeps_maxsize_and_drops_expired(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.db"), maxsize=3)
+    for i in range(5):
+        cache.set(f"k{i}", i, cache.generation())
+    cache.ttl = -1
+    cache.set("expired", 0, cache.generation())
+    cache.trim()
+    assert [cache.get(f"k{i}") for i in range(5)] == [None, None, 2, 3, 4]
+    assert cache.get("expired") is None
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from singleflight import SingleFlight
+
+def counting(calls, result="page", delay=0.01):
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+    return fn
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flights, calls = SingleFlight(), []
+        results = await asyncio.gather(*(flights.run("page-1", counting(calls)) for _ in range(50)))
+        assert results == ["page"] * 50 and len(calls) == 1
+        assert flights.stats() == {'in_flight': 0, 'leaders': 1, 'coalesced': 49, 'reused': 0}
+        await flights.run("page-1", counting(calls)) # No ttl, so the next call runs again
+        assert len(calls) == 2
+    asyncio.run(run())
+
+def test_ttl_reuses_results_until_invalidated():
+    async def run():
+        flights, calls = SingleFlight(ttl=60, cacheable=lambda r: r != "stale"), []
+        await flights.run("a", counting(calls))
+        assert await flights.run("a", counting(calls)) == "page" and flights.reused == 1
+        await flights.run("b", counting(calls, result="stale"))
+        await flights.run("b", counting(calls, result="stale")) # Not cacheable, runs again
+        assert len(calls) == 3
+        flights.invalidate()
+        await flights.run("a", counting(calls))
+        assert len(calls) == 4
+    asyncio.run(run())
+
+def test_errors_reach_every_waiter_and_leader_cancellation_is_harmless():
+    async def run():
+        flights = SingleFlight(ttl=60)
+        async def boom():
+            await asyncio.sleep(0.01)
+            raise ConnectionError("down")
+        results = await asyncio.gather(*(flights.run("x", boom) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ConnectionError) for r in results)
+        calls = []
+        leader = asyncio.ensure_future(flights.run("y", counting(calls, delay=0.05)))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.run("y", counting(calls)))
+        leader.cancel()
+        assert await follower == "page" and len(calls) == 1
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+    asyncio.run(run())
@@ -0,0 +1,84 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import LazyStore, SQLiteStore, create_store, iter_rows
+
+def make_store(tmp_path, n=0):
+    store = SQLiteStore(str(tmp_path / "guestbook.db"))
+    if n:
+        store.insert([{"name": f"User {i}", "message": f"Message {i}", "timestamp": "2025-01-01 10:00:00 AM IST"}
+                      for i in range(1, n + 1)])
+    return store
+
+def test_insert_returns_rows_with_ids(tmp_path):
+    store = make_store(tmp_path)
+    rows = store.insert([{"name": "A", "message": "hi", "timestamp": "t"}, {"name": "B", "message": "yo", "timestamp": "t"}])
+    assert [r["id"] for r in rows] == [1, 2]
+    assert rows[1]["name"] == "B"
+
+def test_fetch_by_cursor_and_offset(tmp_path):
+    store = make_store(tmp_path, n=25)
+    assert [r["id"] for r in store.fetch(3)] == [25, 24, 23]
+    assert [r["id"] for r in store.fetch(3, before=23)] == [22, 21, 20]
+    assert [r["id"] for r in store.fetch(3, offset=3)] == [22, 21, 20]
+    assert store.fetch(3, before=1) == []
+
+def test_wal_mode_and_unknown_backend(tmp_path):
+    store = make_store(tmp_path)
+    assert store._db().journal_mode == "wal"
+    try:
+        create_store("mysql")
+    except ValueError as e:
+        assert "GUESTBOOK_BACKEND" in str(e)
+    else:
+        assert False, "expected ValueError"
+
+def test_iter_rows_walks_every_chunk(tmp_path):
+    store = make_store(tmp_path, n=25)
+    rows = list(iter_rows(store, columns="id,name", chunk_size=10))
+    assert [r["id"] for r in rows] == list(range(1, 26))
+    assert set(rows[0]) == {"id", "name"}
+
+def test_fetch_since_uses_created_at_and_old_databases_are_migrated(tmp_path):
+    path = str(tmp_path / "old.db")
+    from sqlite_minutils import Database
+    Database(path)["myGuestbook"].create({"id": int, "name": str, "message": str, "timestamp": str}, pk="id")
+    store = SQLiteStore(path)
+    store.insert([{"name": "Old", "message": "hi", "timestamp": "2025-01-01 10:00:00 AM IST"}])
+    store.insert([{"name": f"U{i}", "message": "m", "created_at": 1000 + i} for i in range(5)])
+    assert [r["created_at"] for r in store.fetch_since(1002, limit=10)] == [1004, 1003, 1002]
+    assert [r["id"] for r in store.fetch_since(0, limit=2)] == [6, 5]
+    store.set_created_at([{"id": 1, "created_at": 900}])
+    assert store.get_by_ids([1])[0]["created_at"] == 900
+
+def test_counts_in_one_query(tmp_path):
+    store = make_store(tmp_path)
+    assert store.counts(0) == {"messages": 0, "names": [], "today": 0, "max_id": 0}
+    store.insert([{"name": n, "message": "m", "created_at": t} for n, t in [("Ann", 100), ("ANN", 200), ("Émile", 300), ("émile", 50)]])
+    counts = store.counts(200)
+    assert sorted(counts.pop("names")) == ["ann", "émile"]
+    assert counts == {"messages": 4, "today": 2, "max_id": 4}
+
+def test_lazy_store_creates_the_backend_once_on_first_use(tmp_path):
+    made = []
+    def factory():
+        made.append(1)
+        return make_store(tmp_path, n=3)
+    store = LazyStore(factory)
+    assert made == []
+    assert store.max_id() == 3
+    assert [r["id"] for r in store.fetch(2)] == [3, 2]
+    assert made == [1]
+
+def test_incomplete_backend_fails_when_constructed():
+    from storage import MessageStore
+    class Partial(MessageStore):
+        def insert(self, rows):
+            return rows
+    try:
+        Partial()
+    except TypeError as e:
+        assert "fetch" in str(e)
+    else:
+        assert False, "expected TypeError"
@@ -0,0 +1,59 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from writebehind import WriteBehindQueue
+
+def test_batches_by_size_and_flushes_on_close():
+    batches = []
+    q = WriteBehindQueue(batches.append, max_batch=3, max_delay=5, capacity=10)
+    for i in range(7):
+        assert q.submit({"id": i})
+    assert [r["id"] for r in q.pending()] == [6, 5, 4, 3, 2, 1, 0]
+    q.start().close()
+    assert sum(len(b) for b in batches) == 7
+    assert max(len(b) for b in batches) <= 3
+    assert q.pending() == [] and q.depth() == 0
+    assert not q.submit({"id": 8}) # Closed queues accept nothing
+
+def test_rejects_when_full():
+    release = threading.Event()
+    q = WriteBehindQueue(lambda batch: release.wait(), max_batch=1, max_delay=0, capacity=2)
+    assert q.submit({}) and q.submit({})
+    assert not q.submit({})
+    assert q.stats()['rejected'] == 1 and q.stats()['depth'] == 2
+    release.set()
+    q.start().close()
+    assert q.stats()['flushed'] == 2
+
+def test_blocked_submit_does_not_hold_up_readers():
+    q = WriteBehindQueue(lambda batch: None, capacity=1, block_timeout=0.5)
+    assert q.submit({"id": 1})
+    blocked = threading.Thread(target=q.submit, args=({"id": 2},))
+    blocked.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    assert [r["id"] for r in q.pending()][-1] == 1
+    assert time.monotonic() - start < 0.1 # Not the rest of the block timeout
+    blocked.join()
+    assert [r["id"] for r in q.pending()] == [1] and q.stats()['rejected'] == 1
+
+def test_failed_batches_are_retried_then_given_up():
+    calls, given_up = [], []
+    def flaky(batch):
+        calls.append(len(batch))
+        if len(calls) < 3:
+            raise ConnectionError("down")
+    q = WriteBehindQueue(flaky, max_batch=5, max_delay=0, attempts=3, retry_delay=0, give_up=given_up.append)
+    q.submit({"id": 1})
+    q.start().close()
+    assert calls == [1, 1, 1] and q.stats()['flushed'] == 1 and q.stats()['retries'] == 2 and not given_up
+
+    def down(batch):
+        raise ConnectionError("down")
+    q = WriteBehindQueue(down, max_batch=5, max_delay=0, attempts=2, retry_delay=0, give_up=given_up.append)
+    q.submit({"id": 2})
+    q.start().close()
+    assert given_up == [[{"id": 2}]] and q.stats()['failed'] == 1 and q.pending() == []
@@ -0,0 +1,54 @@
+"""
+Message timestamps.
+
+New rows store `created_at`, a UTC epoch in whole seconds: sortable, indexable and free
+to produce on the write path. Older rows only have `timestamp`, the IST display string
+they were written with, until `python cli.py backfill` converts them. Formatting an
+instant for a visitor's time zone is memoized per (second, zone).
+"""
+import time
+from datetime import datetime
+from functools import lru_cache
+
+TIMESTAMP_FMT = "%Y-%m-%d %I:%M:%S %p %Z"
+LEGACY_TZ = "Asia/Kolkata" # Zone every legacy `timestamp` string was written in
+
+def now():
+    return int(time.time())
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    import pytz # Deferred, it is only needed once a message is shown or a legacy row parsed
+    return pytz.timezone(name)
+
+def valid_zone(name):
+    import pytz
+    return bool(name) and name in pytz.all_timezones_set
+
+@lru_cache(maxsize=4096)
+def format_instant(created_at, tz):
+    return datetime.fromtimestamp(created_at, get_zone(tz)).strftime(TIMESTAMP_FMT)
+
+@lru_cache(maxsize=4096)
+def _day(created_at, tz):
+    return datetime.fromtimestamp(created_at, get_zone(tz)).strftime("%Y-%m-%d")
+
+def display_time(entry, tz):
+    "The message's time as shown on its card, in `tz` when the row has an instant."
+    if entry.get('created_at') is not None:
+        return format_instant(entry['created_at'], tz)
+    return entry.get('timestamp') or ""
+
+def day_of(entry, tz):
+    "Calendar date (YYYY-MM-DD) of a message in `tz`."
+    if entry.get('created_at') is not None:
+        return _day(entry['created_at'] // 60 * 60, tz) # Minute buckets, a date never changes mid-minute
+    return (entry.get('timestamp') or "")[:10] # Legacy strings start with the IST date
+
+def parse_legacy(value):
+    "Epoch seconds for a legacy `timestamp` string such as '2025-01-01 10:00:00 AM IST', or None."
+    try:
+        local = datetime.strptime(value.rsplit(" ", 1)[0], "%Y-%m-%d %I:%M:%S %p")
+    except (AttributeError, ValueError):
+        return None
+    return int(get_zone(LEGACY_TZ).localize(local).timestamp())
@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+
+from resilience import backoff
+
+class WriteBehindQueue:
+    """Buffers validated rows and flushes them from a background thread as one multi-row insert.
+
+    A batch is flushed once `max_batch` rows are waiting or the oldest one has waited
+    `max_delay` seconds. The buffer holds at most `capacity` rows; when it is full
+    `submit` waits up to `block_timeout` seconds (0 rejects straight away). A batch whose
+    insert fails is tried again with jittered backoff, up to `attempts` times in all; after
+    that it is handed to `give_up(batch)` (by default only logged) and leaves `pending`.
+    """
+    def __init__(self, flush_fn, max_batch=50, max_delay=0.5, capacity=1000, block_timeout=0.0,
+                 attempts=5, retry_delay=0.5, give_up=None):
+        self.flush_fn = flush_fn
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self.give_up = give_up
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.capacity = capacity
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=capacity)
+        self._pending = [] # Accepted but not yet flushed, oldest first
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.accepted = self.flushed = self.batches = self.rejected = self.retries = self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="guestbook-write-behind", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, row):
+        if self._stop.is_set():
+            return False
+        with self._pending_lock:
+            self._pending.append(row) # Before the put, so the flusher can't write it before it is listed
+        try:
+            # Outside the lock: a blocking put must not hold up pending() or the flusher
+            if self.block_timeout > 0:
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            with self._pending_lock:
+                self._pending = [r for r in self._pending if r is not row]
+                self.rejected += 1
+            return False
+        with self._pending_lock:
+            self.accepted += 1
+        return True
+
+    def pending(self):
+        "Rows still waiting to be written, newest first."
+        with self._pending_lock:
+            return self._pending[::-1]
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _take_batch(self):
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                # Short waits so close() never sits out a long max_delay
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _flush(self, batch):
+        try:
+            for attempt in range(1, self.attempts + 1):
+                try:
+                    self.flush_fn(batch)
+                except Exception as e:
+                    print(f"Error flushing {len(batch)} queued messages (attempt {attempt} of {self.attempts}): {e}")
+                    if attempt < self.attempts:
+                        self.retries += 1
+                        time.sleep(backoff(attempt, self.retry_delay, 5.0))
+                else:
+                    self.flushed += len(batch)
+                    return
+            self.failed += len(batch)
+            if self.give_up is not None:
+                self.give_up(batch)
+        finally:
+            self.batches += 1
+            with self._pending_lock:
+                done = set(map(id, batch))
+                self._pending = [r for r in self._pending if id(r) not in done]
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+
+    def close(self, timeout=10.0):
+        "Stop accepting rows and flush everything still buffered."
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        while not self._queue.empty(): # Not started, or the thread timed out
+            batch = []
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self._flush(batch)
+
+    def stats(self):
+        return {'depth': self.depth(), 'capacity': self.capacity, 'accepted': self.accepted, 'flushed': self.flushed,
+                'batches': self.batches, 'rejected': self.rejected, 'retries': self.retries, 'failed': self.failed}